@@ -12,6 +12,10 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Use orjson for response encoding
+    from utils.json_provider import OrjsonProvider
+    app.json = OrjsonProvider(app)
+
     # Initialize extensions
     mongo.init_app(app)
     bcrypt.init_app(app)
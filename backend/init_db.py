@@ -660,7 +660,7 @@ class DatabaseInitializer:
             
             # Get enrolled students for this course
             enrollments = list(self.db.enrollments.find({"course_id": course_id, "status": "enrolled"}))
-            student_ids = [str(e["student_id"]) for e in enrollments]
+            student_ids = [e["student_id"] for e in enrollments]
             
             # Create attendance for last 20 class days
             for day_offset in range(0, 40, 2):  # Every other day for 20 records
@@ -671,18 +671,16 @@ class DatabaseInitializer:
                     continue
                 
                 record_id = ObjectId()
-                student_attendances = {}
                 
                 # Generate attendance for each student (85% attendance rate)
-                for student_id in student_ids:
-                    is_present = random.choice([True] * 85 + [False] * 15)  # 85% attendance
-                    student_attendances[student_id] = is_present
+                present = [random.choice([True] * 85 + [False] * 15) for _ in student_ids]  # 85% attendance
                 
                 attendance = {
                     "_id": record_id,
                     "course_id": course_id,
                     "date": datetime.combine(attendance_date, datetime.min.time()),  # Convert date to datetime
-                    "student_attendances": student_attendances,
+                    "students": student_ids,
+                    "present": present,
                     "recorded_by": teacher_id,
                     "recorded_at": datetime.combine(attendance_date, datetime.min.time()) + timedelta(hours=random.randint(8, 17))
                 }
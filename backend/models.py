@@ -334,7 +334,8 @@ class AttendanceRecord(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     course_id: PyObjectId
     date: date
-    student_attendances: Dict[str, bool] = {}  # student_id -> present/absent
+    students: List[PyObjectId] = []  # student ids, parallel to `present`
+    present: List[bool] = []  # present/absent flag for each entry in `students`
     recorded_by: PyObjectId  # teacher_id
     recorded_at: datetime = Field(default_factory=datetime.utcnow)
 
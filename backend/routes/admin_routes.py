@@ -1,10 +1,13 @@
 from flask import Blueprint, request, jsonify
 from functools import wraps
 from extensions import mongo
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 from bson import ObjectId # For converting string ID to MongoDB ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime, timedelta
-from utils.database import DatabaseUtils, query_cache
+from utils.database import DatabaseUtils
+from utils.security import hash_password, check_password, sanitize_input
 import calendar
 
 admin_bp = Blueprint('admin_bp', __name__)
@@ -158,6 +161,9 @@ def update_course(course_id):
         if result.modified_count == 0 and result.matched_count > 0:
             return jsonify({"message": "No changes made to the course"}), 200
         
+        # Invalidate cache (teacher assignment may have changed)
+        DatabaseUtils.invalidate_cache_for('courses')
+        
         # Return the updated course
         updated_course = mongo.db.courses.find_one({"_id": ObjectId(course_id)})
         serialized_course = DatabaseUtils.serialize_doc(updated_course)
@@ -175,8 +181,8 @@ def delete_course(course_id):
         
         if result.get('course_deleted'):
             # Invalidate cache
-            query_cache.invalidate_pattern('courses')
-            query_cache.invalidate_pattern('enrollments')
+            DatabaseUtils.invalidate_cache_for('courses')
+            DatabaseUtils.invalidate_cache_for('enrollments')
             
             return jsonify({
                 "message": "Course deleted successfully",
@@ -217,7 +223,7 @@ def assign_teacher_to_course(course_id):
         return jsonify({"message": "Teacher not found or user is not a teacher"}), 404
 
     # 2. Check if course exists
-    course = mongo.db.courses.find_one({"_id": ObjectId(course_id)})
+    course = mongo.db.courses.find_one({"_id": ObjectId(course_id)}, {"teacher_id": 1, "course_code": 1})
     if not course:
         return jsonify({"message": "Course not found"}), 404
 
@@ -254,8 +260,8 @@ def assign_teacher_to_course(course_id):
         
         if result.get('success'):
             # Invalidate relevant cache entries
-            query_cache.invalidate_pattern('courses')
-            query_cache.invalidate_pattern('users')
+            DatabaseUtils.invalidate_cache_for('courses')
+            DatabaseUtils.invalidate_cache_for('users')
             
             return jsonify({
                 "message": f"Teacher {teacher['username']} assigned to course {course['course_code']}",
@@ -270,6 +276,167 @@ def assign_teacher_to_course(course_id):
     except Exception as e:
         return jsonify({"message": "Failed to assign teacher", "error": str(e)}), 500
 
+@admin_bp.route('/courses/<string:course_id>/bulk-enroll', methods=['POST'])
+@role_required('admin')
+def bulk_register_and_enroll(course_id):
+    """Register any missing students, enroll them and issue their access tokens in one request.
+
+    Body: {"students": [{"username", "password", "email", ...optional profile fields}]}.
+    Existing accounts must be students and match the given password. Enrollment
+    follows the single-student path: dropped enrollments are re-enrolled, the
+    course's remaining capacity is respected, and the course is added to each
+    student's enrolled_courses. Students already enrolled are left as they are
+    but still receive a token. Rows that fail are reported in "errors".
+    """
+    try:
+        course_object_id = ObjectId(course_id)
+    except Exception:
+        return jsonify({"message": "Invalid course ID format"}), 400
+
+    data = request.get_json() or {}
+    students = data.get('students') or []
+    if not isinstance(students, list) or not students:
+        return jsonify({"message": "A non-empty 'students' list is required"}), 400
+
+    try:
+        course = mongo.db.courses.find_one(
+            {"_id": course_object_id}, {"current_enrollment": 1, "max_capacity": 1}
+        )
+        if not course:
+            return jsonify({"message": "Course not found"}), 404
+
+        now = datetime.utcnow()
+        errors = []
+        valid = {}
+        for index, raw in enumerate(students):
+            if not isinstance(raw, dict):
+                errors.append(f"Student {index}: missing username, password, or email")
+                continue
+            # Sanitize everything but the password, which is hashed and checked
+            # as given, like the register and login routes do
+            student = sanitize_input({k: v for k, v in raw.items() if k != 'password'})
+            student['password'] = raw.get('password')
+            if not all(student.get(k) for k in ('username', 'password', 'email')):
+                errors.append(f"Student {index}: missing username, password, or email")
+            elif not isinstance(student['password'], str):
+                errors.append(f"Student {index}: password must be a string")
+            elif student['username'] in valid:
+                errors.append(f"Student {index}: duplicate username {student['username']}")
+            else:
+                valid[student['username']] = student
+
+        # One lookup for every account that already exists
+        existing = {
+            u['username']: u for u in mongo.db.users.find(
+                {"username": {"$in": list(valid)}},
+                {"username": 1, "role": 1, "password_hash": 1}
+            )
+        }
+
+        new_users = [
+            {
+                "username": student['username'],
+                "password_hash": hash_password(student['password']),
+                "email": student['email'],
+                "role": "student",
+                "first_name": student.get('first_name'),
+                "last_name": student.get('last_name'),
+                "student_id_str": student.get('student_id_str'),
+                "major": student.get('major'),
+                "date_joined": now,
+                "is_active": True,
+                "enrolled_courses": [],
+                "courses_teaching": [],
+            }
+            for username, student in valid.items() if username not in existing
+        ]
+        created_count = 0
+        if new_users:
+            # insert_many assigns each _id client-side, so the documents that made it
+            # in are known even when others hit a unique index (e.g. a taken email)
+            try:
+                mongo.db.users.insert_many(new_users, ordered=False)
+                failed = {}
+            except BulkWriteError as e:
+                failed = {err['index']: err.get('errmsg', 'insert failed') for err in e.details.get('writeErrors', [])}
+            for index, user in enumerate(new_users):
+                if index in failed:
+                    errors.append(f"Could not create user {user['username']}: {failed[index]}")
+                    valid.pop(user['username'])
+                else:
+                    existing[user['username']] = user
+                    created_count += 1
+
+        students_by_id = {}
+        for username, student in valid.items():
+            user = existing[username]
+            if user.get('role') != 'student':
+                errors.append(f"User {username} is not a student")
+            elif not check_password(user['password_hash'], student['password']):
+                errors.append(f"Invalid credentials for existing user {username}")
+            else:
+                students_by_id[user['_id']] = username
+
+        enrollment_status = {
+            e['student_id']: e['status'] for e in mongo.db.enrollments.find(
+                {"course_id": course_object_id, "student_id": {"$in": list(students_by_id)}},
+                {"student_id": 1, "status": 1}
+            )
+        }
+
+        seats_left = course.get('max_capacity', 0) - course.get('current_enrollment', 0)
+        enrolled_ids = []
+        enroll_ops = []
+        for student_id, username in students_by_id.items():
+            status = enrollment_status.get(student_id)
+            if status == 'enrolled':
+                enrolled_ids.append(student_id)
+            elif status not in (None, 'dropped'):
+                errors.append(f"User {username}: current enrollment status: {status}")
+            elif len(enroll_ops) >= seats_left:
+                errors.append(f"User {username}: course is full")
+            else:
+                # New enrollment, or a dropped student re-enrolled as of now
+                enroll_ops.append(UpdateOne(
+                    {"student_id": student_id, "course_id": course_object_id},
+                    {"$set": {"status": "enrolled", "enrollment_date": now}},
+                    upsert=True
+                ))
+                enrolled_ids.append(student_id)
+
+        if enroll_ops:
+            mongo.db.enrollments.bulk_write(enroll_ops, ordered=False)
+            mongo.db.courses.update_one(
+                {"_id": course_object_id},
+                {"$inc": {"current_enrollment": len(enroll_ops)}}
+            )
+        if enrolled_ids:
+            mongo.db.users.update_many(
+                {"_id": {"$in": enrolled_ids}},
+                {"$addToSet": {"enrolled_courses": course_object_id}}
+            )
+
+        DatabaseUtils.invalidate_cache_for('courses')
+        DatabaseUtils.invalidate_cache_for('users')
+        DatabaseUtils.invalidate_cache_for('enrollments')
+
+        return jsonify({
+            "message": f"Enrolled {len(enroll_ops)} student(s)",
+            "created_count": created_count,
+            "enrolled_count": len(enroll_ops),
+            "user_ids": [str(student_id) for student_id in enrolled_ids],
+            "tokens": {
+                students_by_id[student_id]: create_access_token(
+                    identity={'username': students_by_id[student_id], 'role': 'student'}
+                )
+                for student_id in enrolled_ids
+            },
+            "errors": errors
+        }), 200
+
+    except Exception as e:
+        return jsonify({"message": "Failed to bulk enroll students", "error": str(e)}), 500
+
 # --- User Management Endpoints (Admin) ---
 @admin_bp.route('/users', methods=['GET'])
 @role_required('admin')
@@ -354,6 +521,9 @@ def update_user(user_id):
         if result.modified_count == 0 and result.matched_count > 0:
             return jsonify({"message": "No changes made to the user"}), 200
         
+        # Invalidate cache (username may have changed)
+        DatabaseUtils.invalidate_cache_for('users')
+        
         # Return the updated user
         updated_user = mongo.db.users.find_one({"_id": ObjectId(user_id)}, {'password': 0})
         serialized_user = DatabaseUtils.serialize_doc(updated_user)
@@ -378,13 +548,13 @@ def delete_user(user_id):
             user_role = result.get('user', {}).get('role', 'unknown')
             
             # Invalidate cache
-            query_cache.invalidate_pattern('users')
+            DatabaseUtils.invalidate_cache_for('users')
             if user_role == 'student':
-                query_cache.invalidate_pattern('enrollments')
-                query_cache.invalidate_pattern('submissions')
-                query_cache.invalidate_pattern('grades')
+                DatabaseUtils.invalidate_cache_for('enrollments')
+                DatabaseUtils.invalidate_cache_for('submissions')
+                DatabaseUtils.invalidate_cache_for('grades')
             elif user_role == 'teacher':
-                query_cache.invalidate_pattern('courses')
+                DatabaseUtils.invalidate_cache_for('courses')
             
             # Build response details
             details = {
@@ -501,140 +671,144 @@ def get_system_stats():
     except Exception as e:
         return jsonify({"message": "Failed to retrieve system stats", "error": str(e)}), 500
 
-@admin_bp.route('/reports/enrollment-trends', methods=['GET'])
-@role_required('admin')
-def get_enrollment_trends():
-    """Get enrollment trends over time."""
-    try:
-        period = request.args.get('period', 'month')
-        
-        # Determine the aggregation period and date range
-        if period == 'week':
-            days_back = 7 * 12  # 12 weeks
-            date_format = "%Y-W%U"
-        elif period == 'quarter':
-            days_back = 90 * 4  # 4 quarters
-            date_format = "%Y-Q"
-        elif period == 'year':
-            days_back = 365 * 3  # 3 years
-            date_format = "%Y"
-        else:  # month
-            days_back = 30 * 12  # 12 months
-            date_format = "%Y-%m"
-        
-        start_date = datetime.utcnow() - timedelta(days=days_back)
-        
-        # Aggregate enrollment data
-        pipeline = [
-            {
-                "$match": {
-                    "enrollment_date": {"$gte": start_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": date_format,
-                            "date": "$enrollment_date"
-                        }
-                    },
-                    "enrollments": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
+# Lookback window and bucket format for each trends period
+TREND_PERIODS = {
+    'week': (7 * 12, "%Y-W%U"),  # 12 weeks
+    'quarter': (90 * 4, "%Y-Q"),  # 4 quarters
+    'year': (365 * 3, "%Y"),  # 3 years
+    'month': (30 * 12, "%Y-%m"),  # 12 months
+}
+
+@DatabaseUtils.cached_query('reports:enrollment_trends', ttl=300,
+                            invalidate_on=['enrollments', 'users', 'assignment_submissions'])
+def _enrollment_trends(period):
+    """Enrollments, new users and completed assignments per period bucket."""
+    days_back, date_format = TREND_PERIODS[period]
+    
+    start_date = datetime.utcnow() - timedelta(days=days_back)
+    
+    # Aggregate enrollment data
+    pipeline = [
+        {
+            "$match": {
+                "enrollment_date": {"$gte": start_date}
             }
-        ]
-        
-        enrollment_data = list(mongo.db.enrollments.aggregate(pipeline))
-        
-        # Get new users data
-        user_pipeline = [
-            {
-                "$match": {
-                    "date_joined": {"$gte": start_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": date_format,
-                            "date": "$date_joined"
-                        }
-                    },
-                    "new_users": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
+        },
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": {
+                        "format": date_format,
+                        "date": "$enrollment_date"
+                    }
+                },
+                "enrollments": {"$sum": 1}
             }
-        ]
-        
-        user_data = list(mongo.db.users.aggregate(user_pipeline))
-        
-        # Get assignment completion data
-        completion_pipeline = [
-            {
-                "$match": {
-                    "submission_date": {"$gte": start_date},
-                    "status": {"$in": ["submitted", "graded"]}
-                }
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": date_format,
-                            "date": "$submission_date"
-                        }
-                    },
-                    "completed_assignments": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"_id": 1}
+        },
+        {
+            "$sort": {"_id": 1}
+        }
+    ]
+    
+    enrollment_data = list(mongo.db.enrollments.aggregate(pipeline))
+    
+    # Get new users data
+    user_pipeline = [
+        {
+            "$match": {
+                "date_joined": {"$gte": start_date}
             }
-        ]
-        
-        completion_data = list(mongo.db.assignment_submissions.aggregate(completion_pipeline))
-        
-        # Combine data
-        trends = {}
-        for item in enrollment_data:
+        },
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": {
+                        "format": date_format,
+                        "date": "$date_joined"
+                    }
+                },
+                "new_users": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"_id": 1}
+        }
+    ]
+    
+    user_data = list(mongo.db.users.aggregate(user_pipeline))
+    
+    # Get assignment completion data
+    completion_pipeline = [
+        {
+            "$match": {
+                "submission_date": {"$gte": start_date},
+                "status": {"$in": ["submitted", "graded"]}
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": {
+                        "format": date_format,
+                        "date": "$submission_date"
+                    }
+                },
+                "completed_assignments": {"$sum": 1}
+            }
+        },
+        {
+            "$sort": {"_id": 1}
+        }
+    ]
+    
+    completion_data = list(mongo.db.assignment_submissions.aggregate(completion_pipeline))
+    
+    # Combine data
+    trends = {}
+    for item in enrollment_data:
+        trends[item['_id']] = {
+            "period": item['_id'],
+            "enrollments": item['enrollments'],
+            "new_users": 0,
+            "completed_assignments": 0
+        }
+    
+    for item in user_data:
+        if item['_id'] in trends:
+            trends[item['_id']]['new_users'] = item['new_users']
+        else:
             trends[item['_id']] = {
                 "period": item['_id'],
-                "enrollments": item['enrollments'],
-                "new_users": 0,
+                "enrollments": 0,
+                "new_users": item['new_users'],
                 "completed_assignments": 0
             }
+    
+    for item in completion_data:
+        if item['_id'] in trends:
+            trends[item['_id']]['completed_assignments'] = item['completed_assignments']
+        elif item['_id'] not in trends:
+            trends[item['_id']] = {
+                "period": item['_id'],
+                "enrollments": 0,
+                "new_users": 0,
+                "completed_assignments": item['completed_assignments']
+            }
+    
+    result = sorted(trends.values(), key=lambda x: x['period'])
+    return result
+
+@admin_bp.route('/reports/enrollment-trends', methods=['GET'])
+@role_required('admin')
+def get_enrollment_trends():
+    """Get enrollment trends over time."""
+    try:
+        period = request.args.get('period', 'month')
+        if period not in TREND_PERIODS:
+            period = 'month'
         
-        for item in user_data:
-            if item['_id'] in trends:
-                trends[item['_id']]['new_users'] = item['new_users']
-            else:
-                trends[item['_id']] = {
-                    "period": item['_id'],
-                    "enrollments": 0,
-                    "new_users": item['new_users'],
-                    "completed_assignments": 0
-                }
-        
-        for item in completion_data:
-            if item['_id'] in trends:
-                trends[item['_id']]['completed_assignments'] = item['completed_assignments']
-            elif item['_id'] not in trends:
-                trends[item['_id']] = {
-                    "period": item['_id'],
-                    "enrollments": 0,
-                    "new_users": 0,
-                    "completed_assignments": item['completed_assignments']
-                }
-        
-        result = sorted(trends.values(), key=lambda x: x['period'])
-        
-        return jsonify(result), 200
+        # Cached per period; admin and student writes to the source collections drop it
+        return jsonify(_enrollment_trends(period)), 200
     except Exception as e:
         return jsonify({"message": "Failed to retrieve enrollment trends", "error": str(e)}), 500
 
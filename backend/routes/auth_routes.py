@@ -48,7 +48,14 @@ def register():
         # Get the created user and serialize it (exclude password)
         created_user = mongo.db.users.find_one({"_id": result.inserted_id}, {'password_hash': 0})
         serialized_user = DatabaseUtils.serialize_doc(created_user)
-        return jsonify({"message": "User registered successfully", "user": serialized_user}), 201
+        # Issue the token here so new users do not need a separate login request
+        access_token = create_access_token(identity={'username': username, 'role': role})
+        return jsonify({
+            "message": "User registered successfully",
+            "user": serialized_user,
+            "user_id": str(result.inserted_id),
+            "access_token": access_token
+        }), 201
     except Exception as e:
         return jsonify({"message": "Could not register user", "error": str(e)}), 500
 
@@ -237,6 +237,7 @@ def enroll_in_course(user_id):
             {"_id": course_id},
             {"$inc": {"current_enrollment": 1}}
         )
+        DatabaseUtils.invalidate_cache_for('enrollments', 'courses')
         
         return jsonify({"message": "Successfully enrolled in course"}), 201
         
@@ -496,6 +497,7 @@ def submit_assignment(user_id, assignment_id_str):
             # Create new submission
             mongo.db.assignment_submissions.insert_one(submission_data)
             message = "Assignment submitted successfully"
+        DatabaseUtils.invalidate_cache_for('assignment_submissions')
         
         if is_late:
             message += " (submitted late)"
@@ -757,10 +759,8 @@ def get_course_attendance(user_id, course_id_str):
         attended_classes = 0
         attendance_details = []
         
-        user_id_str = str(user_id)
-        
         for record in attendance_records:
-            was_present = record.get('student_attendances', {}).get(user_id_str, False)
+            was_present = DatabaseUtils.attendance_present(record, user_id)
             if was_present:
                 attended_classes += 1
             
@@ -891,7 +891,7 @@ def get_course_feedback(user_id, course_id_str):
 def generate_transcript(user_id):
     """Generate and download student transcript."""
     try:
-        from backend.utils.pdf_generator import PDFGenerator
+        from utils.pdf_generator import PDFGenerator
         
         pdf_gen = PDFGenerator()
         transcript_pdf = pdf_gen.generate_transcript(user_id)
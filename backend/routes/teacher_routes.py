@@ -1,11 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, send_file, stream_with_context
 from functools import wraps
+from werkzeug.exceptions import HTTPException
 from extensions import mongo
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
 from utils.database import DatabaseUtils, query_cache
 from utils.security import sanitize_input
+import csv
+import io
 try:
     from dateutil.parser import parse as parse_date
 except ImportError:
@@ -21,6 +26,15 @@ except ImportError:
 
 teacher_bp = Blueprint('teacher_bp', __name__)
 
+# Letter grade cutoffs (ascending) and the letter for each band, lowest first
+GRADE_CUTOFFS = [60, 70, 80, 90]
+GRADE_LETTERS = 'FDCBA'
+
+# Seconds a cached course-ownership check stays valid
+OWNERSHIP_CACHE_TTL = 60
+# Seconds a cached username -> user _id resolution stays valid
+IDENTITY_CACHE_TTL = 30
+
 # Legacy compatibility for existing code
 def serialize_document(doc):
     """Legacy wrapper for DatabaseUtils.serialize_doc"""
@@ -36,15 +50,107 @@ def role_required(role_name):
             if not isinstance(current_user_identity, dict) or current_user_identity.get('role') != role_name:
                 return jsonify({"message": f"Unauthorized: Action requires {role_name} role"}), 403
             
-            user = mongo.db.users.find_one({"username": current_user_identity.get('username')})
-            if not user:
-                return jsonify({"message": "Authenticated user not found in database."}), 404
+            # Resolve the teacher's ObjectId, skipping the lookup on cache hits. This
+            # stands in for overlapping the lookup with the route's query (the app is
+            # synchronous PyMongo); the short TTL bounds how long other workers accept
+            # a deleted user, since the admin invalidation is in-process only
+            cache_key = f"users:id:{current_user_identity.get('username')}"
+            teacher_id = query_cache.get(cache_key)
+            if teacher_id is None:
+                user = mongo.db.users.find_one({"username": current_user_identity.get('username')}, {"_id": 1})
+                if not user:
+                    return jsonify({"message": "Authenticated user not found in database."}), 404
+                teacher_id = user['_id']
+                query_cache.set(cache_key, teacher_id, ttl=IDENTITY_CACHE_TTL)
             
             # Pass the user's ObjectId (as teacher_id) to the decorated function
-            return fn(teacher_id=user['_id'], *args, **kwargs)
+            return fn(teacher_id=teacher_id, *args, **kwargs)
         return wrapper
     return decorator
 
+# --- Uniform error responses for the blueprint ---
+@teacher_bp.errorhandler(Exception)
+def _handle_unexpected_error(e):
+    """Log unexpected errors and report them without leaking internals."""
+    if isinstance(e, HTTPException):
+        return e
+    # A blueprint handler for Exception outranks the app's handlers for narrower
+    # classes, e.g. flask_jwt_extended's 401/422 responses; defer to those
+    app_handlers = current_app.error_handler_spec[None][None]
+    for cls in type(e).__mro__:
+        if cls is Exception:
+            break
+        if cls in app_handlers:
+            return app_handlers[cls](e)
+    current_app.logger.exception(f"Unhandled error in {request.endpoint}")
+    return jsonify({"message": "Internal server error"}), 500
+
+# --- Helper for course ownership checks ---
+def _teacher_owns_course(teacher_id, course_id):
+    """Check whether the teacher is assigned to the course, caching positive results.
+
+    Entries live under the 'courses' cache prefix so the admin course routes
+    invalidate them whenever a course is reassigned, updated or deleted. That
+    only reaches the worker handling the admin request, so entries also expire
+    after OWNERSHIP_CACHE_TTL seconds to bound how long other workers keep
+    authorizing an unassigned teacher.
+    """
+    cache_key = f"courses:owner:{teacher_id}:{course_id}"
+    if query_cache.get(cache_key):
+        return True
+
+    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id}, {"_id": 1})
+    if not course:
+        return False
+
+    query_cache.set(cache_key, True, ttl=OWNERSHIP_CACHE_TTL)
+    return True
+
+# --- Helpers for list endpoints ---
+def _pagination_args():
+    """Parse the page/per_page query arguments; None if either isn't a positive integer."""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 50))
+    except ValueError:
+        return None
+    if page < 1 or per_page < 1:
+        return None
+    return page, min(per_page, 500)  # Max 500 per page
+
+def _stream_errors(chunks):
+    """Log errors raised while streaming a response body.
+
+    The blueprint error handler can't help once the headers have gone out, so
+    the failure is logged here and re-raised: the server then aborts the
+    transfer and the client sees an incomplete response rather than a body
+    that ends cleanly but is truncated.
+    """
+    try:
+        yield from chunks
+    except Exception:
+        current_app.logger.exception(f"Error while streaming the response for {request.endpoint}")
+        raise
+
+def _stream_json_array(items, prefix='[', suffix=']'):
+    """Stream items as a JSON array as the cursor yields them, between prefix and suffix."""
+    dumps = current_app.json.dumps
+    items = iter(items)
+    # Fetch the first item before the headers are sent, so a failing query
+    # still gets a proper error response
+    end = object()
+    first = next(items, end)
+
+    def generate():
+        yield prefix
+        if first is not end:
+            yield dumps(first)
+            for item in items:
+                yield ',' + dumps(item)
+        yield suffix
+
+    return Response(stream_with_context(_stream_errors(generate())), mimetype='application/json')
+
 # Placeholder for teacher routes
 @teacher_bp.route('/ping', methods=['GET'])
 @role_required('teacher')
@@ -56,30 +162,27 @@ def ping_teacher(teacher_id):
 @role_required('teacher')
 def get_teacher_dashboard_stats(teacher_id):
     """Get dashboard statistics for the teacher."""
-    try:
-        # Get basic statistics
-        total_courses = mongo.db.courses.count_documents({"teacher_id": teacher_id})
-        
-        # Get total students across all teacher's courses
-        course_ids = [course['_id'] for course in mongo.db.courses.find({"teacher_id": teacher_id}, {"_id": 1})]
-        total_students = mongo.db.enrollments.count_documents({
-            "course_id": {"$in": course_ids},
-            "status": "enrolled"
-        }) if course_ids else 0
-        
-        total_assignments = mongo.db.assignments.count_documents({"teacher_id": teacher_id})
-        total_quizzes = mongo.db.quizzes.count_documents({"teacher_id": teacher_id})
-
-        stats = {
-            "total_courses": total_courses,
-            "total_students": total_students,
-            "total_assignments": total_assignments,
-            "total_quizzes": total_quizzes
-        }
+    # Get basic statistics
+    total_courses = mongo.db.courses.count_documents({"teacher_id": teacher_id})
+    
+    # Get total students across all teacher's courses
+    course_ids = [course['_id'] for course in mongo.db.courses.find({"teacher_id": teacher_id}, {"_id": 1})]
+    total_students = mongo.db.enrollments.count_documents({
+        "course_id": {"$in": course_ids},
+        "status": "enrolled"
+    }) if course_ids else 0
+    
+    total_assignments = mongo.db.assignments.count_documents({"teacher_id": teacher_id})
+    total_quizzes = mongo.db.quizzes.count_documents({"teacher_id": teacher_id})
+
+    stats = {
+        "total_courses": total_courses,
+        "total_students": total_students,
+        "total_assignments": total_assignments,
+        "total_quizzes": total_quizzes
+    }
 
-        return jsonify(stats), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve dashboard stats", "error": str(e)}), 500
+    return jsonify(stats), 200
 
 # Endpoints for viewing taught courses and students in those courses will be added here.
 
@@ -87,45 +190,42 @@ def get_teacher_dashboard_stats(teacher_id):
 @role_required('teacher')
 def get_my_taught_courses(teacher_id):
     """Lists all courses the authenticated teacher is assigned to teach."""
-    try:
-        # Get limit parameter if provided
-        limit = request.args.get('limit', type=int)
-        
-        courses_cursor = mongo.db.courses.find({"teacher_id": teacher_id}).sort("course_code", 1)
+    # Get limit parameter if provided
+    limit = request.args.get('limit', type=int)
+    
+    courses_cursor = mongo.db.courses.find({"teacher_id": teacher_id}).sort("course_code", 1)
+    
+    # Apply limit if specified
+    if limit:
+        courses_cursor = courses_cursor.limit(limit)
+    
+    courses_list = []
+    for course in courses_cursor:
+        # Manually construct course data to avoid ObjectId issues
+        course_data = {
+            "_id": str(course['_id']),
+            "course_code": course.get('course_code', ''),
+            "course_name": course.get('course_name', ''),
+            "credits": course.get('credits', 0),
+            "semester": course.get('semester', ''),
+            "year": course.get('year', ''),
+            "department": course.get('department', ''),
+            "description": course.get('description', ''),
+            "schedule_info": course.get('schedule_info', ''),
+            "max_capacity": course.get('max_capacity', 0),
+            "teacher_id": str(course.get('teacher_id', '')),
+            "assignments": [str(aid) for aid in course.get('assignments', [])],
+            "quizzes": [str(qid) for qid in course.get('quizzes', [])]
+        }
         
-        # Apply limit if specified
-        if limit:
-            courses_cursor = courses_cursor.limit(limit)
+        # Add student count for each course
+        course_data['current_enrollment'] = mongo.db.enrollments.count_documents({
+            "course_id": course['_id'],
+            "status": "enrolled"
+        })
         
-        courses_list = []
-        for course in courses_cursor:
-            # Manually construct course data to avoid ObjectId issues
-            course_data = {
-                "_id": str(course['_id']),
-                "course_code": course.get('course_code', ''),
-                "course_name": course.get('course_name', ''),
-                "credits": course.get('credits', 0),
-                "semester": course.get('semester', ''),
-                "year": course.get('year', ''),
-                "department": course.get('department', ''),
-                "description": course.get('description', ''),
-                "schedule_info": course.get('schedule_info', ''),
-                "max_capacity": course.get('max_capacity', 0),
-                "teacher_id": str(course.get('teacher_id', '')),
-                "assignments": [str(aid) for aid in course.get('assignments', [])],
-                "quizzes": [str(qid) for qid in course.get('quizzes', [])]
-            }
-            
-            # Add student count for each course
-            course_data['current_enrollment'] = mongo.db.enrollments.count_documents({
-                "course_id": course['_id'],
-                "status": "enrolled"
-            })
-            
-            courses_list.append(course_data)
-        return jsonify(courses_list), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve taught courses", "error": str(e)}), 500
+        courses_list.append(course_data)
+    return jsonify(courses_list), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/students', methods=['GET'])
 @role_required('teacher')
@@ -137,45 +237,42 @@ def get_students_in_course(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # 1. Verify the teacher is actually teaching this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        # Find all 'enrolled' records for the course
-        enrollment_records = list(mongo.db.enrollments.find({"course_id": course_id, "status": "enrolled"}))
-        
-        student_ids = [record['student_id'] for record in enrollment_records]
-        if not student_ids:
-            return jsonify([]), 200 # No students enrolled
-
-        # Fetch details of these students (e.g., name, email, student_id_str, major)
-        # Adjust projection as needed
-        students_cursor = mongo.db.users.find(
-            {"_id": {"$in": student_ids}, "role": "student"},
-            {"_id": 1, "username": 1, "email": 1, "first_name": 1, "last_name": 1, "student_id_str": 1, "major": 1}
-        )
+    # Join 'enrolled' records for the course to their student details server-side
+    # (e.g., name, email, student_id_str, major). Adjust projection as needed
+    students_cursor = mongo.db.enrollments.aggregate([
+        {"$match": {"course_id": course_id, "status": "enrolled"}},
+        {"$lookup": {
+            "from": "users",
+            "let": {"student_id": "$student_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$student_id"]}, "role": "student"}},
+                {"$project": {"_id": 1, "username": 1, "email": 1, "first_name": 1, "last_name": 1, "student_id_str": 1, "major": 1}}
+            ],
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$replaceRoot": {"newRoot": "$student_info"}}
+    ])
+    
+    students_list = []
+    for student in students_cursor:
+        student_doc = {
+            "_id": str(student['_id']),  # Add _id field for frontend consistency
+            "user_id": str(student['_id']),
+            "username": student.get("username"),
+            "email": student.get("email"),
+            "first_name": student.get("first_name", ""),
+            "last_name": student.get("last_name", ""),
+            "student_id_str": student.get("student_id_str", "N/A"),
+            "major": student.get("major", "Not specified")  # Add major field
+        }
+        # Could add enrollment_date here if needed from enrollment_records
+        students_list.append(student_doc)
         
-        students_list = []
-        # Create a mapping from enrollment record for easy lookup if more enrollment-specific data is needed
-        # For now, just associating student details.
-        for student in students_cursor:
-            student_doc = {
-                "_id": str(student['_id']),  # Add _id field for frontend consistency
-                "user_id": str(student['_id']),
-                "username": student.get("username"),
-                "email": student.get("email"),
-                "first_name": student.get("first_name", ""),
-                "last_name": student.get("last_name", ""),
-                "student_id_str": student.get("student_id_str", "N/A"),
-                "major": student.get("major", "Not specified")  # Add major field
-            }
-            # Could add enrollment_date here if needed from enrollment_records
-            students_list.append(student_doc)
-            
-        return jsonify(students_list), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve students for the course", "error": str(e)}), 500
+    return jsonify(students_list), 200
 
 # === ASSIGNMENT MANAGEMENT ===
 
@@ -189,41 +286,67 @@ def get_course_assignments(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        assignments = list(mongo.db.assignments.find({
-            "course_id": course_id,
-            "teacher_id": teacher_id
-        }).sort("due_date", 1))
+    assignments = list(mongo.db.assignments.find({
+        "course_id": course_id,
+        "teacher_id": teacher_id
+    }).sort("due_date", 1))
 
-        serialized_assignments = []
-        for assignment in assignments:
-            # Properly serialize the assignment document
-            assignment_data = serialize_document(assignment)
-            
-            # Add submission statistics
-            total_submissions = mongo.db.assignment_submissions.count_documents({
-                "assignment_id": assignment['_id']  # Use original ObjectId for queries
-            })
-            graded_submissions = mongo.db.assignment_submissions.count_documents({
-                "assignment_id": assignment['_id'],  # Use original ObjectId for queries
-                "score": {"$exists": True, "$ne": None}
-            })
-            
-            assignment_data['submission_stats'] = {
-                "total_submissions": total_submissions,
-                "graded_submissions": graded_submissions,
-                "pending_grading": total_submissions - graded_submissions
-            }
+    serialized_assignments = []
+    for assignment in assignments:
+        # Properly serialize the assignment document
+        assignment_data = serialize_document(assignment)
+        
+        # Add submission statistics
+        total_submissions = mongo.db.assignment_submissions.count_documents({
+            "assignment_id": assignment['_id']  # Use original ObjectId for queries
+        })
+        graded_submissions = mongo.db.assignment_submissions.count_documents({
+            "assignment_id": assignment['_id'],  # Use original ObjectId for queries
+            "score": {"$exists": True, "$ne": None}
+        })
+        
+        assignment_data['submission_stats'] = {
+            "total_submissions": total_submissions,
+            "graded_submissions": graded_submissions,
+            "pending_grading": total_submissions - graded_submissions
+        }
 
-            serialized_assignments.append(assignment_data)
+        serialized_assignments.append(assignment_data)
 
-        return jsonify(serialized_assignments), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve assignments", "error": str(e)}), 500
+    return jsonify(serialized_assignments), 200
+
+# --- Helpers shared by single and batch assignment creation ---
+ASSIGNMENT_REQUIRED_FIELDS = ['title', 'assignment_type', 'total_points', 'due_date']
+ASSIGNMENT_TYPES = ['Project', 'Homework']
+
+def _validate_assignment_data(data):
+    """Return an error message for an invalid assignment payload, or None."""
+    for field in ASSIGNMENT_REQUIRED_FIELDS:
+        if field not in data:
+            return f"Missing required field: {field}"
+    if data['assignment_type'] not in ASSIGNMENT_TYPES:
+        return f"Assignment type must be one of: {', '.join(ASSIGNMENT_TYPES)}"
+    return None
+
+def _build_assignment_doc(data, course_id, teacher_id):
+    """Build the assignment document stored for a validated payload."""
+    return {
+        "title": data['title'],
+        "description": data.get('description', ''),
+        "assignment_type": data['assignment_type'],
+        "total_points": int(data['total_points']),
+        "due_date": parse_date(data['due_date']),
+        "instructions": data.get('instructions', ''),
+        "attachments": data.get('attachments', []),
+        "course_id": course_id,
+        "teacher_id": teacher_id,
+        "is_published": data.get('is_published', True),
+        "created_date": datetime.utcnow(),
+        "submissions": []
+    }
 
 @teacher_bp.route('/courses/<string:course_id_str>/assignments', methods=['POST'])
 @role_required('teacher')
@@ -235,56 +358,94 @@ def create_assignment(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     data = request.get_json()
     
-    # Validate required fields
-    required_fields = ['title', 'assignment_type', 'total_points', 'due_date']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"message": f"Missing required field: {field}"}), 400
+    error = _validate_assignment_data(data)
+    if error:
+        return jsonify({"message": error}), 400
 
-    # Validate assignment type
-    allowed_types = ['Project', 'Homework']
-    if data['assignment_type'] not in allowed_types:
-        return jsonify({"message": f"Assignment type must be one of: {', '.join(allowed_types)}"}), 400
+    assignment_data = _build_assignment_doc(data, course_id, teacher_id)
 
+    result = mongo.db.assignments.insert_one(assignment_data)
+    
+    # Add assignment to course's assignments list
+    mongo.db.courses.update_one(
+        {"_id": course_id},
+        {"$push": {"assignments": result.inserted_id}}
+    )
+
+    return jsonify({
+        "message": "Assignment created successfully",
+        "assignment_id": str(result.inserted_id)
+    }), 201
+
+@teacher_bp.route('/courses/<string:course_id_str>/assignments/batch', methods=['POST'])
+@role_required('teacher')
+def create_assignments_batch(teacher_id, course_id_str):
+    """Create several assignments for a course in one request."""
     try:
-        # Parse due date
-        due_date = parse_date(data['due_date'])
-        
-        assignment_data = {
-            "title": data['title'],
-            "description": data.get('description', ''),
-            "assignment_type": data['assignment_type'],
-            "total_points": int(data['total_points']),
-            "due_date": due_date,
-            "instructions": data.get('instructions', ''),
-            "attachments": data.get('attachments', []),
-            "course_id": course_id,
-            "teacher_id": teacher_id,
-            "is_published": data.get('is_published', True),
-            "created_date": datetime.utcnow(),
-            "submissions": []
-        }
+        course_id = ObjectId(course_id_str)
+    except Exception:
+        return jsonify({"message": "Invalid course ID format"}), 400
 
-        result = mongo.db.assignments.insert_one(assignment_data)
-        
-        # Add assignment to course's assignments list
+    # Verify teacher teaches this course
+    if not _teacher_owns_course(teacher_id, course_id):
+        return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
+
+    data = request.get_json()
+    assignments_data = data.get('assignments', [])
+
+    if not assignments_data:
+        return jsonify({"message": "No assignments provided"}), 400
+
+    errors = []
+    documents = []
+    # assignment_ids lines up with the submitted rows; rows that fail stay None
+    assignment_ids = [None] * len(assignments_data)
+    doc_rows = []
+    for row_index, entry in enumerate(assignments_data):
+        try:
+            error = _validate_assignment_data(entry)
+            if error:
+                errors.append(f"Assignment {row_index}: {error}")
+                continue
+            document = _build_assignment_doc(entry, course_id, teacher_id)
+            document['_id'] = ObjectId()
+            documents.append(document)
+            doc_rows.append(row_index)
+            assignment_ids[row_index] = str(document['_id'])
+        except Exception as e:
+            errors.append(f"Assignment {row_index}: {str(e)}")
+
+    inserted_ids = []
+    if documents:
+        failed = set()
+        try:
+            mongo.db.assignments.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed.add(write_error['index'])
+                errors.append(f"Error inserting assignment {doc_rows[write_error['index']]}: {write_error.get('errmsg')}")
+                assignment_ids[doc_rows[write_error['index']]] = None
+        inserted_ids = [doc['_id'] for i, doc in enumerate(documents) if i not in failed]
+
+    if inserted_ids:
+        # Add every new assignment to the course's assignments list in one update
         mongo.db.courses.update_one(
             {"_id": course_id},
-            {"$push": {"assignments": result.inserted_id}}
+            {"$push": {"assignments": {"$each": inserted_ids}}}
         )
 
-        return jsonify({
-            "message": "Assignment created successfully",
-            "assignment_id": str(result.inserted_id)
-        }), 201
-    except Exception as e:
-        return jsonify({"message": "Failed to create assignment", "error": str(e)}), 500
+    return jsonify({
+        "message": f"Batch create completed. {len(inserted_ids)} assignments created, {len(errors)} errors.",
+        "created_count": len(inserted_ids),
+        "error_count": len(errors),
+        "errors": errors,
+        "assignment_ids": assignment_ids
+    }), 201 if inserted_ids else 400
 
 @teacher_bp.route('/assignments/<string:assignment_id_str>', methods=['PUT'])
 @role_required('teacher')
@@ -311,36 +472,33 @@ def update_assignment(teacher_id, assignment_id_str):
         if data['assignment_type'] not in allowed_types:
             return jsonify({"message": f"Assignment type must be one of: {', '.join(allowed_types)}"}), 400
 
-    try:
-        update_data = {}
-        
-        # Update fields if provided
-        if 'title' in data and data['title'].strip():
-            update_data['title'] = data['title'].strip()
-        if 'description' in data:
-            update_data['description'] = data['description'].strip()
-        if 'assignment_type' in data:
-            update_data['assignment_type'] = data['assignment_type']
-        if 'total_points' in data:
-            update_data['total_points'] = int(data['total_points'])
-        if 'due_date' in data:
-            update_data['due_date'] = parse_date(data['due_date'])
-        if 'instructions' in data:
-            update_data['instructions'] = data['instructions'].strip()
-        if 'is_published' in data:
-            update_data['is_published'] = bool(data['is_published'])
-
-        update_data['updated_date'] = datetime.utcnow()
-
-        if update_data:
-            mongo.db.assignments.update_one(
-                {"_id": assignment_id},
-                {"$set": update_data}
-            )
-
-        return jsonify({"message": "Assignment updated successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to update assignment", "error": str(e)}), 500
+    update_data = {}
+    
+    # Update fields if provided
+    if 'title' in data and data['title'].strip():
+        update_data['title'] = data['title'].strip()
+    if 'description' in data:
+        update_data['description'] = data['description'].strip()
+    if 'assignment_type' in data:
+        update_data['assignment_type'] = data['assignment_type']
+    if 'total_points' in data:
+        update_data['total_points'] = int(data['total_points'])
+    if 'due_date' in data:
+        update_data['due_date'] = parse_date(data['due_date'])
+    if 'instructions' in data:
+        update_data['instructions'] = data['instructions'].strip()
+    if 'is_published' in data:
+        update_data['is_published'] = bool(data['is_published'])
+
+    update_data['updated_date'] = datetime.utcnow()
+
+    if update_data:
+        mongo.db.assignments.update_one(
+            {"_id": assignment_id},
+            {"$set": update_data}
+        )
+
+    return jsonify({"message": "Assignment updated successfully"}), 200
 
 @teacher_bp.route('/assignments/<string:assignment_id_str>', methods=['DELETE'])
 @role_required('teacher')
@@ -359,22 +517,19 @@ def delete_assignment(teacher_id, assignment_id_str):
     if not assignment:
         return jsonify({"message": "Assignment not found or you don't have permission"}), 404
 
-    try:
-        # Remove assignment from course's assignments list
-        mongo.db.courses.update_one(
-            {"_id": assignment['course_id']},
-            {"$pull": {"assignments": assignment_id}}
-        )
+    # Remove assignment from course's assignments list
+    mongo.db.courses.update_one(
+        {"_id": assignment['course_id']},
+        {"$pull": {"assignments": assignment_id}}
+    )
 
-        # Delete all submissions for this assignment
-        mongo.db.assignment_submissions.delete_many({"assignment_id": assignment_id})
+    # Delete all submissions for this assignment
+    mongo.db.assignment_submissions.delete_many({"assignment_id": assignment_id})
 
-        # Delete the assignment
-        mongo.db.assignments.delete_one({"_id": assignment_id})
+    # Delete the assignment
+    mongo.db.assignments.delete_one({"_id": assignment_id})
 
-        return jsonify({"message": "Assignment deleted successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to delete assignment", "error": str(e)}), 500
+    return jsonify({"message": "Assignment deleted successfully"}), 200
 
 @teacher_bp.route('/assignments/<string:assignment_id_str>/submissions', methods=['GET'])
 @role_required('teacher')
@@ -393,50 +548,44 @@ def get_assignment_submissions(teacher_id, assignment_id_str):
     if not assignment:
         return jsonify({"message": "Assignment not found or you don't have permission"}), 404
 
-    try:
-        # Get all submissions with student info
-        submissions = list(mongo.db.assignment_submissions.aggregate([
-            {"$match": {"assignment_id": assignment_id}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "student_id",
-                "foreignField": "_id",
-                "as": "student_info"
-            }},
-            {"$unwind": "$student_info"},
-            {"$project": {
-                "_id": 1,
-                "content": 1,
-                "attachments": 1,
-                "submission_date": 1,
-                "score": 1,
-                "feedback": 1,
-                "status": 1,
-                "graded_date": 1,
-                "student": {
-                    "id": "$student_info._id",
-                    "name": {
-                        "$concat": [
-                            "$student_info.first_name",
-                            " ",
-                            "$student_info.last_name"
-                        ]
-                    },
-                    "email": "$student_info.email",
-                    "student_id_str": "$student_info.student_id_str"
-                }
-            }},
-            {"$sort": {"submission_date": 1}}
-        ]))
+    # Get all submissions with student info
+    submissions = list(mongo.db.assignment_submissions.aggregate([
+        {"$match": {"assignment_id": assignment_id}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "_id",
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$project": {
+            "_id": 1,
+            "content": 1,
+            "attachments": 1,
+            "submission_date": 1,
+            "score": 1,
+            "feedback": 1,
+            "status": 1,
+            "graded_date": 1,
+            "student": {
+                "id": "$student_info._id",
+                "first_name": "$student_info.first_name",
+                "last_name": "$student_info.last_name",
+                "email": "$student_info.email",
+                "student_id_str": "$student_info.student_id_str"
+            }
+        }},
+        {"$sort": {"submission_date": 1}}
+    ]))
 
-        # Convert ObjectIds to strings
-        for submission in submissions:
-            submission['_id'] = str(submission['_id'])
-            submission['student']['id'] = str(submission['student']['id'])
+    # Convert ObjectIds to strings and build display names
+    for submission in submissions:
+        student = submission['student']
+        submission['_id'] = str(submission['_id'])
+        student['id'] = str(student['id'])
+        student['name'] = f"{student.get('first_name', '')} {student.get('last_name', '')}".strip()
 
-        return jsonify(submissions), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve submissions", "error": str(e)}), 500
+    return jsonify(submissions), 200
 
 @teacher_bp.route('/submissions/<string:submission_id_str>/grade', methods=['POST'])
 @role_required('teacher')
@@ -454,42 +603,39 @@ def grade_assignment_submission(teacher_id, submission_id_str):
     if score is None:
         return jsonify({"message": "Score is required"}), 400
 
-    try:
-        # Get submission and verify teacher owns the assignment
-        submission = mongo.db.assignment_submissions.find_one({"_id": submission_id})
-        if not submission:
-            return jsonify({"message": "Submission not found"}), 404
-
-        assignment = mongo.db.assignments.find_one({
-            "_id": submission['assignment_id'],
-            "teacher_id": teacher_id
-        })
-        if not assignment:
-            return jsonify({"message": "You don't have permission to grade this submission"}), 403
-
-        # Validate score
-        if not isinstance(score, (int, float)) or score < 0 or score > assignment['total_points']:
-            return jsonify({
-                "message": f"Score must be between 0 and {assignment['total_points']}"
-            }), 400
-
-        # Update submission with grade
-        mongo.db.assignment_submissions.update_one(
-            {"_id": submission_id},
-            {
-                "$set": {
-                    "score": float(score),
-                    "feedback": feedback,
-                    "graded_date": datetime.utcnow(),
-                    "graded_by": teacher_id,
-                    "status": "graded"
-                }
+    # Get submission and verify teacher owns the assignment
+    submission = mongo.db.assignment_submissions.find_one({"_id": submission_id})
+    if not submission:
+        return jsonify({"message": "Submission not found"}), 404
+
+    assignment = mongo.db.assignments.find_one({
+        "_id": submission['assignment_id'],
+        "teacher_id": teacher_id
+    })
+    if not assignment:
+        return jsonify({"message": "You don't have permission to grade this submission"}), 403
+
+    # Validate score
+    if not isinstance(score, (int, float)) or score < 0 or score > assignment['total_points']:
+        return jsonify({
+            "message": f"Score must be between 0 and {assignment['total_points']}"
+        }), 400
+
+    # Update submission with grade
+    mongo.db.assignment_submissions.update_one(
+        {"_id": submission_id},
+        {
+            "$set": {
+                "score": float(score),
+                "feedback": feedback,
+                "graded_date": datetime.utcnow(),
+                "graded_by": teacher_id,
+                "status": "graded"
             }
-        )
+        }
+    )
 
-        return jsonify({"message": "Submission graded successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to grade submission", "error": str(e)}), 500
+    return jsonify({"message": "Submission graded successfully"}), 200
 
 # === QUIZ MANAGEMENT ===
 
@@ -503,35 +649,31 @@ def get_course_quizzes(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        quizzes = list(mongo.db.quizzes.find({
-            "course_id": course_id,
-            "teacher_id": teacher_id
-        }).sort("due_date", 1))
+    quizzes = list(mongo.db.quizzes.find({
+        "course_id": course_id,
+        "teacher_id": teacher_id
+    }).sort("due_date", 1))
 
-        serialized_quizzes = []
-        for quiz in quizzes:
-            # Properly serialize the quiz document
-            quiz_data = serialize_document(quiz)
-            
-            # Add submission statistics
-            total_submissions = mongo.db.quiz_submissions.count_documents({
-                "quiz_id": quiz['_id']  # Use original ObjectId for queries
-            })
-            
-            quiz_data['submission_stats'] = {
-                "total_submissions": total_submissions
-            }
+    serialized_quizzes = []
+    for quiz in quizzes:
+        # Properly serialize the quiz document
+        quiz_data = serialize_document(quiz)
+        
+        # Add submission statistics
+        total_submissions = mongo.db.quiz_submissions.count_documents({
+            "quiz_id": quiz['_id']  # Use original ObjectId for queries
+        })
+        
+        quiz_data['submission_stats'] = {
+            "total_submissions": total_submissions
+        }
 
-            serialized_quizzes.append(quiz_data)
+        serialized_quizzes.append(quiz_data)
 
-        return jsonify(serialized_quizzes), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve quizzes", "error": str(e)}), 500
+    return jsonify(serialized_quizzes), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/quizzes', methods=['POST'])
 @role_required('teacher')
@@ -543,8 +685,7 @@ def create_quiz(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     data = request.get_json()
@@ -555,42 +696,39 @@ def create_quiz(teacher_id, course_id_str):
         if field not in data:
             return jsonify({"message": f"Missing required field: {field}"}), 400
 
-    try:
-        due_date = parse_date(data['due_date'])
-        start_date = parse_date(data['start_date'])
-        
-        quiz_data = {
-            "title": data['title'],
-            "description": data.get('description', ''),
-            "quiz_type": data.get('quiz_type', 'Practice'),
-            "total_points": int(data['total_points']),
-            "time_limit": data.get('time_limit', 60),
-            "due_date": due_date,
-            "start_date": start_date,
-            "end_date": due_date,  # Always set end_date to due_date
-            "questions": data.get('questions', []),
-            "course_id": course_id,
-            "teacher_id": teacher_id,
-            "is_published": data.get('is_published', True),
-            "created_date": datetime.utcnow(),
-            "attempts_allowed": data.get('attempts_allowed', 1),
-            "submissions": []
-        }
-
-        result = mongo.db.quizzes.insert_one(quiz_data)
-        
-        # Add quiz to course's quizzes list
-        mongo.db.courses.update_one(
-            {"_id": course_id},
-            {"$push": {"quizzes": result.inserted_id}}
-        )
+    due_date = parse_date(data['due_date'])
+    start_date = parse_date(data['start_date'])
+    
+    quiz_data = {
+        "title": data['title'],
+        "description": data.get('description', ''),
+        "quiz_type": data.get('quiz_type', 'Practice'),
+        "total_points": int(data['total_points']),
+        "time_limit": data.get('time_limit', 60),
+        "due_date": due_date,
+        "start_date": start_date,
+        "end_date": due_date,  # Always set end_date to due_date
+        "questions": data.get('questions', []),
+        "course_id": course_id,
+        "teacher_id": teacher_id,
+        "is_published": data.get('is_published', True),
+        "created_date": datetime.utcnow(),
+        "attempts_allowed": data.get('attempts_allowed', 1),
+        "submissions": []
+    }
+
+    result = mongo.db.quizzes.insert_one(quiz_data)
+    
+    # Add quiz to course's quizzes list
+    mongo.db.courses.update_one(
+        {"_id": course_id},
+        {"$push": {"quizzes": result.inserted_id}}
+    )
 
-        return jsonify({
-            "message": "Quiz created successfully",
-            "quiz_id": str(result.inserted_id)
-        }), 201
-    except Exception as e:
-        return jsonify({"message": "Failed to create quiz", "error": str(e)}), 500
+    return jsonify({
+        "message": "Quiz created successfully",
+        "quiz_id": str(result.inserted_id)
+    }), 201
 
 @teacher_bp.route('/quizzes/<string:quiz_id_str>', methods=['PUT'])
 @role_required('teacher')
@@ -611,42 +749,39 @@ def update_quiz(teacher_id, quiz_id_str):
 
     data = request.get_json()
     
-    try:
-        update_data = {}
-        
-        # Update fields if provided
-        if 'title' in data and data['title'].strip():
-            update_data['title'] = data['title'].strip()
-        if 'description' in data:
-            update_data['description'] = data['description'].strip()
-        if 'quiz_type' in data:
-            update_data['quiz_type'] = data['quiz_type']
-        if 'total_points' in data:
-            update_data['total_points'] = int(data['total_points'])
-        if 'time_limit' in data:
-            update_data['time_limit'] = int(data['time_limit'])
-        if 'due_date' in data:
-            due_date = parse_date(data['due_date'])
-            update_data['due_date'] = due_date
-            update_data['end_date'] = due_date  # Keep end_date in sync
-        if 'start_date' in data:
-            update_data['start_date'] = parse_date(data['start_date'])
-        if 'is_published' in data:
-            update_data['is_published'] = bool(data['is_published'])
-        if 'questions' in data:
-            update_data['questions'] = data['questions']
-
-        update_data['updated_date'] = datetime.utcnow()
-
-        if update_data:
-            mongo.db.quizzes.update_one(
-                {"_id": quiz_id},
-                {"$set": update_data}
-            )
-
-        return jsonify({"message": "Quiz updated successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to update quiz", "error": str(e)}), 500
+    update_data = {}
+    
+    # Update fields if provided
+    if 'title' in data and data['title'].strip():
+        update_data['title'] = data['title'].strip()
+    if 'description' in data:
+        update_data['description'] = data['description'].strip()
+    if 'quiz_type' in data:
+        update_data['quiz_type'] = data['quiz_type']
+    if 'total_points' in data:
+        update_data['total_points'] = int(data['total_points'])
+    if 'time_limit' in data:
+        update_data['time_limit'] = int(data['time_limit'])
+    if 'due_date' in data:
+        due_date = parse_date(data['due_date'])
+        update_data['due_date'] = due_date
+        update_data['end_date'] = due_date  # Keep end_date in sync
+    if 'start_date' in data:
+        update_data['start_date'] = parse_date(data['start_date'])
+    if 'is_published' in data:
+        update_data['is_published'] = bool(data['is_published'])
+    if 'questions' in data:
+        update_data['questions'] = data['questions']
+
+    update_data['updated_date'] = datetime.utcnow()
+
+    if update_data:
+        mongo.db.quizzes.update_one(
+            {"_id": quiz_id},
+            {"$set": update_data}
+        )
+
+    return jsonify({"message": "Quiz updated successfully"}), 200
 
 @teacher_bp.route('/quizzes/<string:quiz_id_str>', methods=['DELETE'])
 @role_required('teacher')
@@ -665,22 +800,19 @@ def delete_quiz(teacher_id, quiz_id_str):
     if not quiz:
         return jsonify({"message": "Quiz not found or you don't have permission"}), 404
 
-    try:
-        # Remove quiz from course's quizzes list
-        mongo.db.courses.update_one(
-            {"_id": quiz['course_id']},
-            {"$pull": {"quizzes": quiz_id}}
-        )
+    # Remove quiz from course's quizzes list
+    mongo.db.courses.update_one(
+        {"_id": quiz['course_id']},
+        {"$pull": {"quizzes": quiz_id}}
+    )
 
-        # Delete all submissions for this quiz
-        mongo.db.quiz_submissions.delete_many({"quiz_id": quiz_id})
+    # Delete all submissions for this quiz
+    mongo.db.quiz_submissions.delete_many({"quiz_id": quiz_id})
 
-        # Delete the quiz
-        mongo.db.quizzes.delete_one({"_id": quiz_id})
+    # Delete the quiz
+    mongo.db.quizzes.delete_one({"_id": quiz_id})
 
-        return jsonify({"message": "Quiz deleted successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to delete quiz", "error": str(e)}), 500
+    return jsonify({"message": "Quiz deleted successfully"}), 200
 
 @teacher_bp.route('/quizzes/<string:quiz_id_str>/submissions', methods=['GET'])
 @role_required('teacher')
@@ -699,49 +831,43 @@ def get_quiz_submissions(teacher_id, quiz_id_str):
     if not quiz:
         return jsonify({"message": "Quiz not found or you don't have permission"}), 404
 
-    try:
-        # Get all submissions with student info
-        submissions = list(mongo.db.quiz_submissions.aggregate([
-            {"$match": {"quiz_id": quiz_id}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "student_id",
-                "foreignField": "_id",
-                "as": "student_info"
-            }},
-            {"$unwind": "$student_info"},
-            {"$project": {
-                "_id": 1,
-                "answers": 1,
-                "submission_date": 1,
-                "score": 1,
-                "time_taken": 1,
-                "attempt_number": 1,
-                "status": 1,
-                "student": {
-                    "id": "$student_info._id",
-                    "name": {
-                        "$concat": [
-                            "$student_info.first_name",
-                            " ",
-                            "$student_info.last_name"
-                        ]
-                    },
-                    "email": "$student_info.email",
-                    "student_id_str": "$student_info.student_id_str"
-                }
-            }},
-            {"$sort": {"submission_date": 1}}
-        ]))
+    # Get all submissions with student info
+    submissions = list(mongo.db.quiz_submissions.aggregate([
+        {"$match": {"quiz_id": quiz_id}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "_id",
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$project": {
+            "_id": 1,
+            "answers": 1,
+            "submission_date": 1,
+            "score": 1,
+            "time_taken": 1,
+            "attempt_number": 1,
+            "status": 1,
+            "student": {
+                "id": "$student_info._id",
+                "first_name": "$student_info.first_name",
+                "last_name": "$student_info.last_name",
+                "email": "$student_info.email",
+                "student_id_str": "$student_info.student_id_str"
+            }
+        }},
+        {"$sort": {"submission_date": 1}}
+    ]))
 
-        # Convert ObjectIds to strings
-        for submission in submissions:
-            submission['_id'] = str(submission['_id'])
-            submission['student']['id'] = str(submission['student']['id'])
+    # Convert ObjectIds to strings and build display names
+    for submission in submissions:
+        student = submission['student']
+        submission['_id'] = str(submission['_id'])
+        student['id'] = str(student['id'])
+        student['name'] = f"{student.get('first_name', '')} {student.get('last_name', '')}".strip()
 
-        return jsonify(submissions), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve quiz submissions", "error": str(e)}), 500
+    return jsonify(submissions), 200
 
 # === ATTENDANCE MANAGEMENT ===
 
@@ -755,51 +881,88 @@ def get_course_attendance_records(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        # Get all attendance records for the course
-        attendance_records = list(mongo.db.attendance.find({
+    # Get attendance records for the course, paginated only when requested
+    pagination = None
+    if 'page' in request.args or 'per_page' in request.args:
+        pagination_args = _pagination_args()
+        if pagination_args is None:
+            return jsonify({"message": "page and per_page must be positive integers"}), 400
+        page, per_page = pagination_args
+        result = DatabaseUtils.paginate_query(
+            'attendance',
+            query={"course_id": course_id},
+            page=page,
+            per_page=per_page,
+            sort_field="date",
+            sort_direction=-1
+        )
+        attendance_records = result['data']
+        pagination = result['pagination']
+    else:
+        attendance_records = mongo.db.attendance.find({
             "course_id": course_id
-        }).sort("date", -1))
-
-        # Get enrolled students for reference
-        enrolled_students = list(mongo.db.users.find({
-            "_id": {"$in": [
-                enrollment['student_id'] for enrollment in 
-                mongo.db.enrollments.find({"course_id": course_id, "status": "enrolled"})
-            ]}
-        }, {"first_name": 1, "last_name": 1, "email": 1, "student_id_str": 1}))
-
-        # Format response
-        formatted_records = []
-        for record in attendance_records:
-            record = serialize_document(record)
-            
-            # Convert student_attendances ObjectIds to strings
-            formatted_attendances = {}
-            for student_id_str, present in record.get('student_attendances', {}).items():
-                formatted_attendances[student_id_str] = present
-            record['student_attendances'] = formatted_attendances
-            
-            formatted_records.append(record)
+        }).sort("date", -1)
+
+    # Get enrolled students for reference (single server-side join)
+    enrolled_students = list(mongo.db.enrollments.aggregate([
+        {"$match": {"course_id": course_id, "status": "enrolled"}},
+        {"$lookup": {
+            "from": "users",
+            "let": {"student_id": "$student_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$student_id"]}}},
+                {"$project": {
+                    "name": {"$trim": {"input": {"$concat": [
+                        {"$ifNull": ["$first_name", ""]},
+                        " ",
+                        {"$ifNull": ["$last_name", ""]}
+                    ]}}},
+                    "email": 1,
+                    "student_id_str": 1
+                }}
+            ],
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$replaceRoot": {"newRoot": "$student_info"}}
+    ]))
+
+    def format_record(record):
+        record = serialize_document(record)
+        
+        # Re-materialize the student -> present map at the JSON boundary
+        if 'students' in record:
+            students = record.pop('students')
+            present = record.pop('present', [])
+            record['student_attendances'] = {str(student): flag for student, flag in zip(students, present)}
+        else:
+            # Legacy records still store the map directly
+            record['student_attendances'] = dict(record.get('student_attendances') or {})
+        return record
+
+    enrolled_students = [
+        {
+            "id": str(student['_id']),
+            "name": student['name'],
+            "email": student.get('email'),
+            "student_id_str": student.get('student_id_str')
+        }
+        for student in enrolled_students
+    ]
 
+    if pagination:
         return jsonify({
-            "attendance_records": formatted_records,
-            "enrolled_students": [
-                {
-                    "id": str(student['_id']),
-                    "name": f"{student.get('first_name', '')} {student.get('last_name', '')}".strip(),
-                    "email": student.get('email'),
-                    "student_id_str": student.get('student_id_str')
-                }
-                for student in enrolled_students
-            ]
+            "attendance_records": [format_record(record) for record in attendance_records],
+            "enrolled_students": enrolled_students,
+            "pagination": pagination
         }), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve attendance records", "error": str(e)}), 500
+
+    # Unpaginated: stream the records as the cursor yields them
+    prefix = '{"enrolled_students":' + current_app.json.dumps(enrolled_students) + ',"attendance_records":['
+    return _stream_json_array(map(format_record, attendance_records), prefix=prefix, suffix=']}')
 
 @teacher_bp.route('/courses/<string:course_id_str>/attendance', methods=['POST'])
 @role_required('teacher')
@@ -811,8 +974,7 @@ def record_attendance(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     data = request.get_json()
@@ -822,38 +984,41 @@ def record_attendance(teacher_id, course_id_str):
     if not attendance_date:
         return jsonify({"message": "Date is required"}), 400
 
-    try:
-        parsed_date = parse_date(attendance_date).date()
-        
-        # Check if attendance already recorded for this date
-        existing_record = mongo.db.attendance.find_one({
-            "course_id": course_id,
-            "date": parsed_date
-        })
-
-        attendance_data = {
-            "course_id": course_id,
-            "date": parsed_date,
-            "student_attendances": student_attendances,
-            "recorded_by": teacher_id,
-            "recorded_at": datetime.utcnow()
-        }
+    # BSON has no date-only type, so store midnight of the given day
+    parsed_date = datetime.combine(parse_date(attendance_date).date(), datetime.min.time())
 
-        if existing_record:
-            # Update existing record
-            mongo.db.attendance.update_one(
-                {"_id": existing_record['_id']},
-                {"$set": attendance_data}
-            )
-            message = "Attendance updated successfully"
-        else:
-            # Create new record
-            mongo.db.attendance.insert_one(attendance_data)
-            message = "Attendance recorded successfully"
+    # Store attendance as parallel arrays of student IDs and presence flags
+    students = []
+    present = []
+    for student_id_str, is_present in student_attendances.items():
+        try:
+            students.append(ObjectId(student_id_str))
+        except Exception:
+            students.append(student_id_str)
+        present.append(bool(is_present))
 
-        return jsonify({"message": message}), 201
-    except Exception as e:
-        return jsonify({"message": "Failed to record attendance", "error": str(e)}), 500
+    attendance_data = {
+        "course_id": course_id,
+        "date": parsed_date,
+        "students": students,
+        "present": present,
+        "recorded_by": teacher_id,
+        "recorded_at": datetime.utcnow()
+    }
+
+    # Insert or update the record for this date in a single atomic upsert
+    result = mongo.db.attendance.update_one(
+        {"course_id": course_id, "date": parsed_date},
+        {"$set": attendance_data, "$unset": {"student_attendances": ""}},
+        upsert=True
+    )
+
+    if result.upserted_id:
+        message = "Attendance recorded successfully"
+    else:
+        message = "Attendance updated successfully"
+
+    return jsonify({"message": message}), 201
 
 # === GRADING AND ANALYTICS ===
 
@@ -867,56 +1032,57 @@ def get_course_grades(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        # Get all grades for the course
-        grades = list(mongo.db.grades.aggregate([
-            {"$match": {"course_id": course_id}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "student_id",
-                "foreignField": "_id",
-                "as": "student_info"
-            }},
-            {"$unwind": "$student_info"},
-            {"$project": {
-                "_id": 1,
-                "student_id": 1,
-                "course_id": 1,
-                "student": {
-                    "id": "$student_info._id",
-                    "name": {
-                        "$concat": [
-                            "$student_info.first_name",
-                            " ",
-                            "$student_info.last_name"
-                        ]
-                    },
-                    "email": "$student_info.email",
-                    "student_id_str": "$student_info.student_id_str",
-                    "first_name": "$student_info.first_name",
-                    "last_name": "$student_info.last_name"
+    # Get all grades for the course
+    pipeline = [
+        {"$match": {"course_id": course_id}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "_id",
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$project": {
+            "_id": 1,
+            "student_id": 1,
+            "course_id": 1,
+            "student": {
+                "id": "$student_info._id",
+                "name": {
+                    "$concat": [
+                        "$student_info.first_name",
+                        " ",
+                        "$student_info.last_name"
+                    ]
                 },
-                "components": 1,
-                "final_grade": 1,
-                "final_percentage": 1,
-                "calculated_at": 1
-            }},
-            {"$sort": {"student.name": 1}}
-        ]))
-
-        # Use the serialize_document function to properly handle ObjectIds
-        serialized_grades = []
-        for grade in grades:
-            serialized_grade = serialize_document(grade)
-            serialized_grades.append(serialized_grade)
-
-        return jsonify(serialized_grades), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve grades", "error": str(e)}), 500
+                "email": "$student_info.email",
+                "student_id_str": "$student_info.student_id_str",
+                "first_name": "$student_info.first_name",
+                "last_name": "$student_info.last_name"
+            },
+            "components": 1,
+            "final_grade": 1,
+            "final_percentage": 1,
+            "calculated_at": 1
+        }},
+        {"$sort": {"student.name": 1}}
+    ]
+
+    # Paginate only when requested so existing callers keep the plain list
+    if 'page' in request.args or 'per_page' in request.args:
+        pagination_args = _pagination_args()
+        if pagination_args is None:
+            return jsonify({"message": "page and per_page must be positive integers"}), 400
+        page, per_page = pagination_args
+        result = DatabaseUtils.paginate_aggregation('grades', pipeline, page=page, per_page=per_page)
+        result['data'] = [serialize_document(grade) for grade in result['data']]
+        return jsonify(result), 200
+
+    # Unpaginated: stream the grades as the cursor yields them
+    return _stream_json_array(map(serialize_document, mongo.db.grades.aggregate(pipeline)))
 
 @teacher_bp.route('/courses/<string:course_id_str>/grades/bulk', methods=['POST'])
 @role_required('teacher')
@@ -928,8 +1094,7 @@ def bulk_upload_grades(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     data = request.get_json()
@@ -938,66 +1103,92 @@ def bulk_upload_grades(teacher_id, course_id_str):
     if not grades_data:
         return jsonify({"message": "No grades data provided"}), 400
 
-    try:
-        updated_count = 0
-        error_count = 0
-        errors = []
+    updated_count = 0
+    error_count = 0
+    errors = []
+    # All rows in one upload share the same calculation timestamp
+    now = datetime.utcnow()
+
+    # Resolve every student identifier in a single query
+    identifiers = list({entry.get('student_id') for entry in grades_data if entry.get('student_id')})
+    student_lookup = {}
+    if identifiers:
+        for student in mongo.db.users.find(
+            {
+                "$or": [
+                    {"student_id_str": {"$in": identifiers}},
+                    {"email": {"$in": identifiers}},
+                    {"username": {"$in": identifiers}}
+                ],
+                "role": "student"
+            },
+            {"_id": 1, "student_id_str": 1, "email": 1, "username": 1}
+        ):
+            for field in ('student_id_str', 'email', 'username'):
+                if student.get(field):
+                    student_lookup.setdefault(student[field], student['_id'])
+
+    operations = []
+    # component_ids lines up with the submitted rows; op_rows maps each operation back to its row
+    component_ids = [None] * len(grades_data)
+    op_rows = []
+    for row_index, grade_entry in enumerate(grades_data):
+        try:
+            student_id_str = grade_entry.get('student_id')
+            component_name = grade_entry.get('component_name')
+            points_earned = float(grade_entry.get('points_earned', 0))
+            total_points = float(grade_entry.get('total_points', 0))
+
+            student_id = student_lookup.get(student_id_str)
+            if not student_id:
+                errors.append(f"Student not found: {student_id_str}")
+                error_count += 1
+                continue
 
-        for grade_entry in grades_data:
-            try:
-                student_id_str = grade_entry.get('student_id')
-                component_name = grade_entry.get('component_name')
-                points_earned = float(grade_entry.get('points_earned', 0))
-                total_points = float(grade_entry.get('total_points', 0))
-
-                # Find student
-                student = mongo.db.users.find_one({
-                    "$or": [
-                        {"student_id_str": student_id_str},
-                        {"email": student_id_str},
-                        {"username": student_id_str}
-                    ],
-                    "role": "student"
-                })
-
-                if not student:
-                    errors.append(f"Student not found: {student_id_str}")
-                    error_count += 1
-                    continue
-
-                # Update or create grade record
-                grade_component = {
-                    "component_type": "manual",
-                    "name": component_name,
-                    "points_earned": points_earned,
-                    "total_points": total_points,
-                    "weight": 1.0
-                }
-
-                result = mongo.db.grades.update_one(
-                    {"student_id": student['_id'], "course_id": course_id},
-                    {
-                        "$push": {"components": grade_component},
-                        "$set": {"calculated_at": datetime.utcnow()}
-                    },
-                    upsert=True
-                )
-
-                if result.modified_count > 0 or result.upserted_id:
-                    updated_count += 1
-
-            except Exception as e:
-                errors.append(f"Error processing {grade_entry}: {str(e)}")
+            # Update or create grade record
+            grade_component = {
+                "component_type": grade_entry.get('component_type', 'manual'),
+                "name": component_name,
+                "points_earned": points_earned,
+                "total_points": total_points,
+                "weight": float(grade_entry.get('weight', 1.0)),
+                "component_id": str(ObjectId())
+            }
+
+            operations.append(UpdateOne(
+                {"student_id": student_id, "course_id": course_id},
+                {
+                    "$push": {"components": grade_component},
+                    "$set": {"calculated_at": now}
+                },
+                upsert=True
+            ))
+            op_rows.append(row_index)
+            component_ids[row_index] = grade_component["component_id"]
+
+        except Exception as e:
+            errors.append(f"Error processing {grade_entry}: {str(e)}")
+            error_count += 1
+
+    if operations:
+        try:
+            result = mongo.db.grades.bulk_write(operations, ordered=False)
+            updated_count = result.modified_count + result.upserted_count
+        except BulkWriteError as e:
+            details = e.details
+            updated_count = details.get('nModified', 0) + details.get('nUpserted', 0)
+            for write_error in details.get('writeErrors', []):
+                errors.append(f"Error applying grade update {write_error.get('index')}: {write_error.get('errmsg')}")
                 error_count += 1
+                component_ids[op_rows[write_error['index']]] = None
 
-        return jsonify({
-            "message": f"Bulk upload completed. {updated_count} grades updated, {error_count} errors.",
-            "updated_count": updated_count,
-            "error_count": error_count,
-            "errors": errors
-        }), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to process bulk upload", "error": str(e)}), 500
+    return jsonify({
+        "message": f"Bulk upload completed. {updated_count} grades updated, {error_count} errors.",
+        "updated_count": updated_count,
+        "error_count": error_count,
+        "errors": errors,
+        "component_ids": component_ids
+    }), 200
 
 # Individual grade component management
 @teacher_bp.route('/courses/<string:course_id_str>/students/<string:student_id_str>/grades/components', methods=['POST'])
@@ -1011,8 +1202,7 @@ def add_grade_component(teacher_id, course_id_str, student_id_str):
         return jsonify({"message": "Invalid ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     # Verify student is enrolled in course
@@ -1025,28 +1215,28 @@ def add_grade_component(teacher_id, course_id_str, student_id_str):
         return jsonify({"message": "Student not found in this course"}), 404
 
     data = request.get_json()
-    try:
-        grade_component = {
-            "component_type": data.get('component_type', 'manual'),
-            "name": data.get('name', ''),
-            "points_earned": float(data.get('points_earned', 0)),
-            "total_points": float(data.get('total_points', 100)),
-            "weight": float(data.get('weight', 1.0)),
-            "component_id": str(ObjectId())  # Generate unique component ID
-        }
-
-        result = mongo.db.grades.update_one(
-            {"student_id": student_id, "course_id": course_id},
-            {
-                "$push": {"components": grade_component},
-                "$set": {"calculated_at": datetime.utcnow()}
-            },
-            upsert=True
-        )
-
-        return jsonify({"message": "Grade component added successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to add grade component", "error": str(e)}), 500
+    grade_component = {
+        "component_type": data.get('component_type', 'manual'),
+        "name": data.get('name', ''),
+        "points_earned": float(data.get('points_earned', 0)),
+        "total_points": float(data.get('total_points', 100)),
+        "weight": float(data.get('weight', 1.0)),
+        "component_id": str(ObjectId())  # Generate unique component ID
+    }
+
+    result = mongo.db.grades.update_one(
+        {"student_id": student_id, "course_id": course_id},
+        {
+            "$push": {"components": grade_component},
+            "$set": {"calculated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+    return jsonify({
+        "message": "Grade component added successfully",
+        "component_id": grade_component["component_id"]
+    }), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/students/<string:student_id_str>/grades/components/<string:component_id_str>', methods=['PUT'])
 @role_required('teacher')
@@ -1059,41 +1249,37 @@ def update_grade_component(teacher_id, course_id_str, student_id_str, component_
         return jsonify({"message": "Invalid ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
     data = request.get_json()
-    try:
-        update_fields = {}
-        if 'component_type' in data:
-            update_fields["components.$.component_type"] = data['component_type']
-        if 'name' in data:
-            update_fields["components.$.name"] = data['name']
-        if 'points_earned' in data:
-            update_fields["components.$.points_earned"] = float(data['points_earned'])
-        if 'total_points' in data:
-            update_fields["components.$.total_points"] = float(data['total_points'])
-        if 'weight' in data:
-            update_fields["components.$.weight"] = float(data['weight'])
-        
-        update_fields["calculated_at"] = datetime.utcnow()
+    update_fields = {}
+    if 'component_type' in data:
+        update_fields["components.$.component_type"] = data['component_type']
+    if 'name' in data:
+        update_fields["components.$.name"] = data['name']
+    if 'points_earned' in data:
+        update_fields["components.$.points_earned"] = float(data['points_earned'])
+    if 'total_points' in data:
+        update_fields["components.$.total_points"] = float(data['total_points'])
+    if 'weight' in data:
+        update_fields["components.$.weight"] = float(data['weight'])
+    
+    update_fields["calculated_at"] = datetime.utcnow()
 
-        result = mongo.db.grades.update_one(
-            {
-                "student_id": student_id,
-                "course_id": course_id,
-                "components.component_id": component_id_str
-            },
-            {"$set": update_fields}
-        )
+    result = mongo.db.grades.update_one(
+        {
+            "student_id": student_id,
+            "course_id": course_id,
+            "components.component_id": component_id_str
+        },
+        {"$set": update_fields}
+    )
 
-        if result.matched_count == 0:
-            return jsonify({"message": "Grade component not found"}), 404
+    if result.matched_count == 0:
+        return jsonify({"message": "Grade component not found"}), 404
 
-        return jsonify({"message": "Grade component updated successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to update grade component", "error": str(e)}), 500
+    return jsonify({"message": "Grade component updated successfully"}), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/students/<string:student_id_str>/grades/components/<string:component_id_str>', methods=['DELETE'])
 @role_required('teacher')
@@ -1106,25 +1292,21 @@ def delete_grade_component(teacher_id, course_id_str, student_id_str, component_
         return jsonify({"message": "Invalid ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        result = mongo.db.grades.update_one(
-            {"student_id": student_id, "course_id": course_id},
-            {
-                "$pull": {"components": {"component_id": component_id_str}},
-                "$set": {"calculated_at": datetime.utcnow()}
-            }
-        )
+    result = mongo.db.grades.update_one(
+        {"student_id": student_id, "course_id": course_id},
+        {
+            "$pull": {"components": {"component_id": component_id_str}},
+            "$set": {"calculated_at": datetime.utcnow()}
+        }
+    )
 
-        if result.matched_count == 0:
-            return jsonify({"message": "Grade record not found"}), 404
+    if result.matched_count == 0:
+        return jsonify({"message": "Grade record not found"}), 404
 
-        return jsonify({"message": "Grade component deleted successfully"}), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to delete grade component", "error": str(e)}), 500
+    return jsonify({"message": "Grade component deleted successfully"}), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/students/<string:student_id_str>/grades', methods=['GET'])
 @role_required('teacher')
@@ -1137,56 +1319,56 @@ def get_student_grade(teacher_id, course_id_str, student_id_str):
         return jsonify({"message": "Invalid ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        grade_cursor = mongo.db.grades.aggregate([
-            {"$match": {"student_id": student_id, "course_id": course_id}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "student_id",
-                "foreignField": "_id",
-                "as": "student_info"
-            }},
-            {"$unwind": "$student_info"},
-            {"$project": {
-                "_id": 1,
-                "student_id": 1,
-                "course_id": 1,
-                "student": {
-                    "id": "$student_info._id",
-                    "name": {
-                        "$concat": [
-                            "$student_info.first_name",
-                            " ",
-                            "$student_info.last_name"
-                        ]
-                    },
-                    "email": "$student_info.email",
-                    "student_id_str": "$student_info.student_id_str",
-                    "first_name": "$student_info.first_name",
-                    "last_name": "$student_info.last_name"
+    grade_cursor = mongo.db.grades.aggregate([
+        {"$match": {"student_id": student_id, "course_id": course_id}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "users",
+            "let": {"student_id": "$student_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$student_id"]}}},
+                {"$project": {"first_name": 1, "last_name": 1, "email": 1, "student_id_str": 1}}
+            ],
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$project": {
+            "_id": 1,
+            "student_id": 1,
+            "course_id": 1,
+            "student": {
+                "id": "$student_info._id",
+                "name": {
+                    "$concat": [
+                        "$student_info.first_name",
+                        " ",
+                        "$student_info.last_name"
+                    ]
                 },
-                "components": 1,
-                "final_grade": 1,
-                "final_percentage": 1,
-                "calculated_at": 1
-            }}
-        ])
+                "email": "$student_info.email",
+                "student_id_str": "$student_info.student_id_str",
+                "first_name": "$student_info.first_name",
+                "last_name": "$student_info.last_name"
+            },
+            "components": 1,
+            "final_grade": 1,
+            "final_percentage": 1,
+            "calculated_at": 1
+        }}
+    ])
 
-        try:
-            grade = next(grade_cursor)
-            if grade:
-                serialized_grade = serialize_document(grade)
-                return jsonify(serialized_grade), 200
-            else:
-                return jsonify({"message": "Grade record not found"}), 404
-        except StopIteration:
+    try:
+        grade = next(grade_cursor)
+        if grade:
+            serialized_grade = serialize_document(grade)
+            return jsonify(serialized_grade), 200
+        else:
             return jsonify({"message": "Grade record not found"}), 404
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve student grade", "error": str(e)}), 500
+    except StopIteration:
+        return jsonify({"message": "Grade record not found"}), 404
 
 @teacher_bp.route('/courses/<string:course_id_str>/grades/calculate', methods=['POST'])
 @role_required('teacher')
@@ -1198,56 +1380,60 @@ def calculate_final_grades(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        grades = mongo.db.grades.find({"course_id": course_id})
-        updated_count = 0
-
-        for grade in grades:
-            if grade.get('components'):
-                # Calculate weighted average
-                total_weighted_points = sum(
-                    (comp['points_earned'] / comp['total_points']) * comp['weight']
-                    for comp in grade['components']
-                )
-                total_weight = sum(comp['weight'] for comp in grade['components'])
-                
-                if total_weight > 0:
-                    final_percentage = (total_weighted_points / total_weight) * 100
-                    
-                    # Convert to letter grade
-                    if final_percentage >= 90:
-                        final_grade = 'A'
-                    elif final_percentage >= 80:
-                        final_grade = 'B'
-                    elif final_percentage >= 70:
-                        final_grade = 'C'
-                    elif final_percentage >= 60:
-                        final_grade = 'D'
-                    else:
-                        final_grade = 'F'
-                    
-                    mongo.db.grades.update_one(
-                        {"_id": grade['_id']},
-                        {
-                            "$set": {
-                                "final_percentage": final_percentage,
-                                "final_grade": final_grade,
-                                "calculated_at": datetime.utcnow()
-                            }
-                        }
-                    )
-                    updated_count += 1
+    # Compute weighted averages and letter grades server-side in one update
+    result = mongo.db.grades.update_many(
+        {
+            "course_id": course_id,
+            "components.0": {"$exists": True},
+            "$expr": {"$gt": [{"$sum": "$components.weight"}, 0]}
+        },
+        [
+            {"$set": {
+                "_total_weighted_points": {"$reduce": {
+                    "input": "$components",
+                    "initialValue": 0,
+                    "in": {"$add": [
+                        "$$value",
+                        {"$multiply": [
+                            # A zero-point component would abort the whole update
+                            {"$cond": [
+                                {"$gt": ["$$this.total_points", 0]},
+                                {"$divide": ["$$this.points_earned", "$$this.total_points"]},
+                                0
+                            ]},
+                            "$$this.weight"
+                        ]}
+                    ]}
+                }},
+                "_total_weight": {"$sum": "$components.weight"}
+            }},
+            {"$set": {
+                "final_percentage": {"$multiply": [
+                    {"$divide": ["$_total_weighted_points", "$_total_weight"]}, 100
+                ]}
+            }},
+            {"$set": {
+                "final_grade": {"$switch": {
+                    "branches": [
+                        {"case": {"$gte": ["$final_percentage", cutoff]}, "then": GRADE_LETTERS[i + 1]}
+                        for i, cutoff in reversed(list(enumerate(GRADE_CUTOFFS)))
+                    ],
+                    "default": GRADE_LETTERS[0]
+                }},
+                "calculated_at": datetime.utcnow()
+            }},
+            {"$unset": ["_total_weighted_points", "_total_weight"]}
+        ]
+    )
+    updated_count = result.matched_count
 
-        return jsonify({
-            "message": f"Final grades calculated for {updated_count} students",
-            "updated_count": updated_count
-        }), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to calculate final grades", "error": str(e)}), 500
+    return jsonify({
+        "message": f"Final grades calculated for {updated_count} students",
+        "updated_count": updated_count
+    }), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/grades/stats', methods=['GET'])
 @role_required('teacher')
@@ -1259,54 +1445,71 @@ def get_course_grade_stats(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
-    if not course:
+    if not _teacher_owns_course(teacher_id, course_id):
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        grades = list(mongo.db.grades.find({"course_id": course_id}))
-        
-        if not grades:
-            return jsonify({
-                "total_students": 0,
-                "average_grade": 0,
-                "highest_grade": 0,
-                "lowest_grade": 0,
-                "passing_rate": 0
-            }), 200
-
-        # Calculate current percentages for each student
-        percentages = []
-        for grade in grades:
-            if grade.get('components'):
-                total_weighted_points = sum(
-                    (comp['points_earned'] / comp['total_points']) * comp['weight']
-                    for comp in grade['components']
-                )
-                total_weight = sum(comp['weight'] for comp in grade['components'])
-                
-                if total_weight > 0:
-                    percentage = (total_weighted_points / total_weight) * 100
-                    percentages.append(percentage)
-
-        if percentages:
-            average_grade = sum(percentages) / len(percentages)
-            highest_grade = max(percentages)
-            lowest_grade = min(percentages)
-            passing_count = sum(1 for p in percentages if p >= 60)
-            passing_rate = (passing_count / len(percentages)) * 100
-        else:
-            average_grade = highest_grade = lowest_grade = passing_rate = 0
+    # Compute current percentages and summary statistics server-side
+    stats = list(mongo.db.grades.aggregate([
+        {"$match": {"course_id": course_id}},
+        {"$project": {
+            "_total_weight": {"$sum": "$components.weight"},
+            "_total_weighted_points": {"$reduce": {
+                "input": {"$ifNull": ["$components", []]},
+                "initialValue": 0,
+                "in": {"$add": [
+                    "$$value",
+                    {"$multiply": [
+                        # Same zero-point guard as calculate_final_grades
+                        {"$cond": [
+                            {"$gt": ["$$this.total_points", 0]},
+                            {"$divide": ["$$this.points_earned", "$$this.total_points"]},
+                            0
+                        ]},
+                        "$$this.weight"
+                    ]}
+                ]}
+            }}
+        }},
+        {"$project": {
+            "percentage": {"$cond": [
+                {"$gt": ["$_total_weight", 0]},
+                {"$multiply": [{"$divide": ["$_total_weighted_points", "$_total_weight"]}, 100]},
+                None
+            ]}
+        }},
+        {"$group": {
+            "_id": None,
+            "total_students": {"$sum": 1},
+            "graded_count": {"$sum": {"$cond": [{"$ne": ["$percentage", None]}, 1, 0]}},
+            "passing_count": {"$sum": {"$cond": [{"$gte": ["$percentage", 60]}, 1, 0]}},
+            "average_grade": {"$avg": "$percentage"},
+            "highest_grade": {"$max": "$percentage"},
+            "lowest_grade": {"$min": "$percentage"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "total_students": 1,
+            "average_grade": {"$ifNull": ["$average_grade", 0]},
+            "highest_grade": {"$ifNull": ["$highest_grade", 0]},
+            "lowest_grade": {"$ifNull": ["$lowest_grade", 0]},
+            "passing_rate": {"$cond": [
+                {"$gt": ["$graded_count", 0]},
+                {"$multiply": [{"$divide": ["$passing_count", "$graded_count"]}, 100]},
+                0
+            ]}
+        }}
+    ]))
 
+    if not stats:
         return jsonify({
-            "total_students": len(grades),
-            "average_grade": average_grade,
-            "highest_grade": highest_grade,
-            "lowest_grade": lowest_grade,
-            "passing_rate": passing_rate
+            "total_students": 0,
+            "average_grade": 0,
+            "highest_grade": 0,
+            "lowest_grade": 0,
+            "passing_rate": 0
         }), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve grade statistics", "error": str(e)}), 500
+
+    return jsonify(stats[0]), 200
 
 @teacher_bp.route('/courses/<string:course_id_str>/grades/export', methods=['GET'])
 @role_required('teacher')
@@ -1318,44 +1521,74 @@ def export_grades_to_csv(teacher_id, course_id_str):
         return jsonify({"message": "Invalid course ID format"}), 400
 
     # Verify teacher teaches this course
-    course = mongo.db.courses.find_one({"_id": course_id, "teacher_id": teacher_id})
+    course = mongo.db.courses.find_one(
+        {"_id": course_id, "teacher_id": teacher_id},
+        {"_id": 1, "course_code": 1}
+    )
     if not course:
         return jsonify({"message": "Course not found or you are not assigned to teach this course."}), 404
 
-    try:
-        import csv
-        import io
-        
-        # Get all grades with student info
-        grades = list(mongo.db.grades.aggregate([
-            {"$match": {"course_id": course_id}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "student_id",
-                "foreignField": "_id",
-                "as": "student_info"
-            }},
-            {"$unwind": "$student_info"},
-            {"$sort": {"student_info.last_name": 1, "student_info.first_name": 1}}
-        ]))
+    # Get all unique component names and the row count up front so rows can be streamed.
+    # $unwind drops grades without components, so the row count runs in its own facet.
+    summary = next(mongo.db.grades.aggregate([
+        {"$match": {"course_id": course_id}},
+        {"$facet": {
+            "rows": [{"$count": "n"}],
+            "names": [
+                {"$unwind": "$components"},
+                {"$group": {"_id": None, "names": {"$addToSet": "$components.name"}}}
+            ]
+        }}
+    ]), {})
+    row_count = (summary.get('rows') or [{"n": 0}])[0]['n']
+    all_components = sorted((summary.get('names') or [{"names": []}])[0]['names'])
+
+    header = ['Student ID', 'First Name', 'Last Name', 'Email']
+    header.extend(all_components)
+    header.extend(['Final Percentage', 'Final Grade'])
+
+    header_buffer = io.StringIO()
+    csv.writer(header_buffer).writerow(header)
+    header_line = header_buffer.getvalue().rstrip('\r\n')
+
+    # Lets clients size the export (e.g. via HEAD) without downloading it
+    response_headers = {
+        'Content-Disposition': f'attachment; filename={course["course_code"]}_grades.csv',
+        'X-Row-Count': str(row_count)
+    }
+    if header_line.isascii():
+        response_headers['X-CSV-Header'] = header_line
+
+    if request.method == 'HEAD':
+        return Response(mimetype='text/csv', headers=response_headers)
+
+    # Get all grades with student info (consumed lazily while streaming)
+    grades = mongo.db.grades.aggregate([
+        {"$match": {"course_id": course_id}},
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "_id",
+            "as": "student_info"
+        }},
+        {"$unwind": "$student_info"},
+        {"$sort": {"student_info.last_name": 1, "student_info.first_name": 1}}
+    ])
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return chunk
 
-        # Create CSV content
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
         # Write header
-        header = ['Student ID', 'First Name', 'Last Name', 'Email']
-        
-        # Get all unique component names
-        all_components = set()
-        for grade in grades:
-            for comp in grade.get('components', []):
-                all_components.add(comp['name'])
-        
-        header.extend(sorted(all_components))
-        header.extend(['Final Percentage', 'Final Grade'])
         writer.writerow(header)
-        
+        yield flush()
+
         # Write data rows
         for grade in grades:
             student = grade['student_info']
@@ -1365,34 +1598,30 @@ def export_grades_to_csv(teacher_id, course_id_str):
                 student.get('last_name', ''),
                 student.get('email', '')
             ]
-            
+
             # Add component scores
             component_scores = {}
             for comp in grade.get('components', []):
-                percentage = (comp['points_earned'] / comp['total_points']) * 100
-                component_scores[comp['name']] = f"{percentage:.1f}%"
-            
-            for comp_name in sorted(all_components):
-                row.append(component_scores.get(comp_name, ''))
-            
+                # Zero-point components are accepted on write; don't abort the stream on them
+                if comp['total_points'] > 0:
+                    percentage = (comp['points_earned'] / comp['total_points']) * 100
+                    component_scores[comp['name']] = f"{percentage:.1f}%"
+
+            row.extend(component_scores.get(comp_name, '') for comp_name in all_components)
+
             # Add final grades
             row.append(f"{grade.get('final_percentage', 0):.1f}%" if grade.get('final_percentage') else '')
             row.append(grade.get('final_grade', ''))
-            
+
             writer.writerow(row)
-        
-        # Create response
-        output.seek(0)
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename={course["course_code"]}_grades.csv'
-            }
-        )
-    except Exception as e:
-        return jsonify({"message": "Failed to export grades", "error": str(e)}), 500
+            yield flush()
+
+    # Create streaming response
+    return Response(
+        stream_with_context(_stream_errors(generate_csv())),
+        mimetype='text/csv',
+        headers=response_headers
+    )
 
 # === ANALYTICS AND REPORTS ===
 
@@ -1400,58 +1629,62 @@ def export_grades_to_csv(teacher_id, course_id_str):
 @role_required('teacher')
 def get_teacher_analytics(teacher_id):
     """Get analytics overview for the teacher."""
-    try:
-        # Get basic statistics
-        total_courses = mongo.db.courses.count_documents({"teacher_id": teacher_id})
-        total_students = mongo.db.enrollments.count_documents({
-            "course_id": {"$in": [
-                course['_id'] for course in 
-                mongo.db.courses.find({"teacher_id": teacher_id}, {"_id": 1})
-            ]},
-            "status": "enrolled"
-        })
-        total_assignments = mongo.db.assignments.count_documents({"teacher_id": teacher_id})
-        total_quizzes = mongo.db.quizzes.count_documents({"teacher_id": teacher_id})
-
-        # Get pending grading count
-        pending_grading = mongo.db.assignment_submissions.count_documents({
-            "assignment_id": {"$in": [
-                assignment['_id'] for assignment in 
-                mongo.db.assignments.find({"teacher_id": teacher_id}, {"_id": 1})
-            ]},
-            "score": {"$exists": False}
-        })
-
-        analytics = {
-            "overview": {
-                "total_courses": total_courses,
-                "total_students": total_students,
-                "total_assignments": total_assignments,
-                "total_quizzes": total_quizzes,
-                "pending_grading": pending_grading
-            }
-        }
-
-        return jsonify(analytics), 200
-    except Exception as e:
-        return jsonify({"message": "Failed to retrieve analytics", "error": str(e)}), 500
+    def teacher_count(field, collection, pipeline=()):
+        # Uncorrelated sub-pipeline keyed on teacher_id, counted server-side
+        return {"$lookup": {
+            "from": collection,
+            "pipeline": [{"$match": {"teacher_id": teacher_id}}, *pipeline, {"$count": "n"}],
+            "as": field
+        }}
+
+    def joined_count(collection, foreign_field, condition):
+        # Join each row's _id to collection and keep the joined rows matching condition
+        return [
+            {"$project": {"_id": 1}},
+            {"$lookup": {"from": collection, "localField": "_id", "foreignField": foreign_field, "as": "joined"}},
+            {"$unwind": "$joined"},
+            {"$match": condition}
+        ]
+
+    fields = ["total_courses", "total_students", "total_assignments", "total_quizzes", "pending_grading"]
+
+    # One round-trip for every overview count. The pipeline runs on the teacher's
+    # own user document rather than on a $match over courses, so each count is
+    # independent of whether the teacher has any course rows.
+    counts = next(mongo.db.users.aggregate([
+        {"$match": {"_id": teacher_id}},
+        {"$project": {"_id": 1}},
+        teacher_count("total_courses", "courses"),
+        teacher_count("total_students", "courses",
+                      joined_count("enrollments", "course_id", {"joined.status": "enrolled"})),
+        teacher_count("total_assignments", "assignments"),
+        teacher_count("total_quizzes", "quizzes"),
+        teacher_count("pending_grading", "assignments",
+                      joined_count("assignment_submissions", "assignment_id", {"joined.score": {"$exists": False}})),
+        {"$project": {
+            "_id": 0,
+            **{field: {"$ifNull": [{"$arrayElemAt": [f"${field}.n", 0]}, 0]} for field in fields}
+        }}
+    ]), {})
+
+    analytics = {
+        "overview": {field: counts.get(field, 0) for field in fields}
+    }
+
+    return jsonify(analytics), 200
 
 @teacher_bp.route('/reports/analytics', methods=['GET'])
 @role_required('teacher')
 def generate_teacher_analytics_report(teacher_id):
     """Generate comprehensive analytics report for teacher."""
-    try:
-        from backend.utils.pdf_generator import PDFGenerator
-        
-        pdf_gen = PDFGenerator()
-        analytics_pdf = pdf_gen.generate_teacher_analytics(teacher_id)
-        
-        from flask import send_file
-        return send_file(
-            analytics_pdf,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'teacher_analytics_{teacher_id}.pdf'
-        )
-    except Exception as e:
-        return jsonify({"message": "Failed to generate analytics report", "error": str(e)}), 500 
\ No newline at end of file
+    # Imported here: matplotlib, seaborn and reportlab are only needed for PDFs
+    from utils.pdf_generator import PDFGenerator
+    pdf_gen = PDFGenerator()
+    analytics_pdf = pdf_gen.generate_teacher_analytics(teacher_id)
+    
+    return send_file(
+        analytics_pdf,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'teacher_analytics_{teacher_id}.pdf'
+    )
\ No newline at end of file
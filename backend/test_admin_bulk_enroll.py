@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Live-server tests for POST /api/admin/courses/<course_id>/bulk-enroll
+Covers:
+- Creating missing student accounts and issuing their tokens
+- Duplicate and incomplete rows in the payload
+- Course capacity and re-running the same request
+- Email conflicts with existing accounts
+- users.enrolled_courses and courses.current_enrollment bookkeeping
+
+Requires the backend on localhost:5000 and its MongoDB; skipped otherwise.
+"""
+
+import pytest
+import requests
+from bson import ObjectId
+from pymongo import MongoClient
+from config import Config
+
+BASE_URL = "http://localhost:5000"
+API_BASE = f"{BASE_URL}/api"
+
+# Unique per run so leftovers from an interrupted run never collide
+RUN_ID = str(ObjectId())[-8:]
+
+ADMIN = {
+    "username": "test_admin_bulk_enroll",
+    "email": "admin_bulk_enroll@test.com",
+    "password": "testpass123",
+    "first_name": "Test",
+    "last_name": "Admin",
+    "role": "admin"
+}
+
+def student(n, **overrides):
+    data = {
+        "username": f"bulk_{RUN_ID}_student{n}",
+        "email": f"bulk_{RUN_ID}_student{n}@test.com",
+        "password": "testpass123",
+        "first_name": f"Student{n}",
+        "last_name": "Bulk",
+        "student_id_str": f"B{RUN_ID}{n}",
+        "major": "Computer Science"
+    }
+    data.update(overrides)
+    return data
+
+@pytest.fixture(scope="module")
+def session():
+    http = requests.Session()
+    try:
+        http.get(f"{BASE_URL}/", timeout=2)
+    except requests.exceptions.ConnectionError:
+        pytest.skip(f"No backend running at {BASE_URL}")
+    return http
+
+@pytest.fixture(scope="module")
+def db():
+    client = MongoClient(Config.MONGO_URI, serverSelectionTimeoutMS=2000)
+    yield client.get_database()
+    client.close()
+
+@pytest.fixture(scope="module")
+def admin_headers(session):
+    credentials = {"username": ADMIN["username"], "password": ADMIN["password"]}
+    response = session.post(f"{API_BASE}/auth/login", json=credentials)
+    if response.status_code != 200:
+        session.post(f"{API_BASE}/auth/register", json=ADMIN)
+        response = session.post(f"{API_BASE}/auth/login", json=credentials)
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture(scope="module")
+def course_id(session, admin_headers, db):
+    course_data = {
+        "course_code": f"BULK-{RUN_ID}",
+        "course_name": "Bulk Enroll Test",
+        "credits": 3,
+        "department": "Computer Science",
+        "max_capacity": 2,
+        "semester": "Fall 2024",
+        "year": 2024
+    }
+    response = session.post(f"{API_BASE}/admin/courses", json=course_data, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    course_id = response.json()["course"]["_id"]
+    yield course_id
+    session.delete(f"{API_BASE}/admin/courses/{course_id}", headers=admin_headers)
+    db.users.delete_many({"username": {"$regex": f"^bulk_{RUN_ID}_"}})
+
+def bulk_enroll(session, admin_headers, course_id, students):
+    return session.post(
+        f"{API_BASE}/admin/courses/{course_id}/bulk-enroll",
+        json={"students": students},
+        headers=admin_headers
+    )
+
+def test_creates_and_enrolls_up_to_capacity(session, admin_headers, course_id, db):
+    payload = [
+        student(1),
+        student(2),
+        student(1, email=f"bulk_{RUN_ID}_dup@test.com"),  # repeated username
+        {"username": f"bulk_{RUN_ID}_incomplete"},  # no password or email
+        student(3),  # the course only has two seats
+    ]
+    response = bulk_enroll(session, admin_headers, course_id, payload)
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    assert result["created_count"] == 3
+    assert result["enrolled_count"] == 2
+    assert set(result["tokens"]) == {student(1)["username"], student(2)["username"]}
+    assert len(result["user_ids"]) == 2
+    assert any("duplicate username" in error for error in result["errors"])
+    assert any("missing username, password, or email" in error for error in result["errors"])
+    assert any(student(3)["username"] in error and "full" in error for error in result["errors"])
+
+    course = db.courses.find_one({"_id": ObjectId(course_id)})
+    assert course["current_enrollment"] == 2
+    for user_id in result["user_ids"]:
+        user = db.users.find_one({"_id": ObjectId(user_id)})
+        assert ObjectId(course_id) in user["enrolled_courses"]
+
+def test_rerun_is_idempotent(session, admin_headers, course_id, db):
+    response = bulk_enroll(session, admin_headers, course_id, [student(1), student(2), student(3)])
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    # Already-enrolled students keep their seat and still get tokens
+    assert result["created_count"] == 0
+    assert result["enrolled_count"] == 0
+    assert set(result["tokens"]) == {student(1)["username"], student(2)["username"]}
+    assert db.courses.find_one({"_id": ObjectId(course_id)})["current_enrollment"] == 2
+
+def test_dropped_student_is_re_enrolled(session, admin_headers, course_id, db):
+    dropped_id = db.users.find_one({"username": student(2)["username"]})["_id"]
+    db.enrollments.update_one(
+        {"student_id": dropped_id, "course_id": ObjectId(course_id)},
+        {"$set": {"status": "dropped"}}
+    )
+    db.courses.update_one({"_id": ObjectId(course_id)}, {"$inc": {"current_enrollment": -1}})
+
+    response = bulk_enroll(session, admin_headers, course_id, [student(2)])
+    assert response.status_code == 200, response.text
+    assert response.json()["enrolled_count"] == 1
+    enrollment = db.enrollments.find_one({"student_id": dropped_id, "course_id": ObjectId(course_id)})
+    assert enrollment["status"] == "enrolled"
+    assert db.courses.find_one({"_id": ObjectId(course_id)})["current_enrollment"] == 2
+
+def test_email_conflict_is_reported_not_fatal(session, admin_headers, course_id, db):
+    taken_email = student(1)["email"]
+    response = bulk_enroll(session, admin_headers, course_id, [student(4, email=taken_email), student(1)])
+    assert response.status_code == 200, response.text
+    result = response.json()
+
+    assert result["created_count"] == 0
+    assert any(student(4)["username"] in error for error in result["errors"])
+    assert student(1)["username"] in result["tokens"]
+    assert db.users.find_one({"username": student(4)["username"]}) is None
+
+def test_rejects_wrong_password_for_existing_user(session, admin_headers, course_id):
+    response = bulk_enroll(session, admin_headers, course_id, [student(1, password="wrong-password")])
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["tokens"] == {}
+    assert any("Invalid credentials" in error for error in result["errors"])
+
+def test_requires_admin(session, course_id):
+    response = session.post(
+        f"{API_BASE}/admin/courses/{course_id}/bulk-enroll",
+        json={"students": [student(5)]}
+    )
+    assert response.status_code == 401
+
+def test_password_with_special_characters_can_log_in(session, admin_headers, course_id, db):
+    # Passwords are hashed as given, not HTML-escaped like the profile fields
+    password = "p&ss<word>\"'"
+    db.courses.update_one({"_id": ObjectId(course_id)}, {"$inc": {"max_capacity": 1}})
+    response = bulk_enroll(session, admin_headers, course_id, [student(6, password=password)])
+    assert response.status_code == 200, response.text
+    assert response.json()["created_count"] == 1
+
+    credentials = {"username": student(6)["username"], "password": password}
+    response = session.post(f"{API_BASE}/auth/login", json=credentials)
+    assert response.status_code == 200, response.text
+
+    # Re-running with the same password matches the stored hash
+    response = bulk_enroll(session, admin_headers, course_id, [student(6, password=password)])
+    assert student(6)["username"] in response.json()["tokens"]
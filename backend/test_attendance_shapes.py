@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for reading attendance records in both stored shapes:
+- students/present parallel arrays (current)
+- student_attendances map keyed by student id string (legacy)
+"""
+
+from datetime import datetime
+from bson import ObjectId
+
+from utils.database import DatabaseUtils
+
+STUDENT = ObjectId()
+OTHER_STUDENT = ObjectId()
+ABSENT_STUDENT = ObjectId()
+
+ARRAY_RECORD = {
+    "course_id": ObjectId(),
+    "date": datetime(2024, 9, 2),
+    "students": [OTHER_STUDENT, STUDENT, ABSENT_STUDENT],
+    "present": [False, True, False],
+}
+
+LEGACY_RECORD = {
+    "course_id": ObjectId(),
+    "date": datetime(2024, 9, 3),
+    "student_attendances": {
+        str(OTHER_STUDENT): False,
+        str(STUDENT): True,
+        str(ABSENT_STUDENT): False,
+    },
+}
+
+def test_array_record():
+    assert DatabaseUtils.attendance_present(ARRAY_RECORD, STUDENT) is True
+    assert DatabaseUtils.attendance_present(ARRAY_RECORD, ABSENT_STUDENT) is False
+    # Ids given as strings match the stored ObjectIds
+    assert DatabaseUtils.attendance_present(ARRAY_RECORD, str(STUDENT)) is True
+
+def test_legacy_record():
+    assert DatabaseUtils.attendance_present(LEGACY_RECORD, STUDENT) is True
+    assert DatabaseUtils.attendance_present(LEGACY_RECORD, ABSENT_STUDENT) is False
+    assert DatabaseUtils.attendance_present(LEGACY_RECORD, str(STUDENT)) is True
+
+def test_student_missing_from_record():
+    assert DatabaseUtils.attendance_present(ARRAY_RECORD, ObjectId()) is False
+    assert DatabaseUtils.attendance_present(LEGACY_RECORD, ObjectId()) is False
+
+def test_string_ids_and_short_present_array():
+    # record_attendance keeps ids it cannot parse as strings
+    record = {"students": ["not-an-oid", STUDENT], "present": [True]}
+    assert DatabaseUtils.attendance_present(record, "not-an-oid") is True
+    assert DatabaseUtils.attendance_present(record, STUDENT) is False
+
+def test_mixed_course_history():
+    # A course with a legacy record followed by a migrated one
+    records = [LEGACY_RECORD, ARRAY_RECORD]
+    attended = sum(DatabaseUtils.attendance_present(record, STUDENT) for record in records)
+    assert attended == 2
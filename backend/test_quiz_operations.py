@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import base64
+import hashlib
 import json
+import os
+import time
+from pathlib import Path
 
 # Configuration
 BASE_URL = "http://localhost:5000"
@@ -12,11 +19,56 @@ TEACHER_CREDENTIALS = {
     "password": "password123"
 }
 
+# Reuse one keep-alive connection for the login and every endpoint call
+session = requests.Session()
+session.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset(["HEAD", "GET", "PUT", "DELETE"]))
+))
+
+# A token from TEACHER_TOKEN, or one cached by a previous run, skips the login request
+TOKEN_CACHE_PATH = Path.home() / ".cache" / "gradebook_test_token"
+
+def _credentials_key():
+    raw = f"{TEACHER_CREDENTIALS['username']}:{TEACHER_CREDENTIALS['password']}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _token_seconds_left(token):
+    """Seconds until the JWT expires, or 0 if it cannot be decoded"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return claims.get('exp', 0) - time.time()
+    except (IndexError, ValueError):
+        return 0
+
+def _load_cached_token():
+    try:
+        cached = json.loads(TOKEN_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    if cached.get('key') != _credentials_key():
+        return None
+    token = cached.get('token', '')
+    return token if _token_seconds_left(token) > 60 else None
+
 def get_teacher_token():
     """Login as teacher and get JWT token"""
-    response = requests.post(LOGIN_URL, json=TEACHER_CREDENTIALS)
+    token = os.getenv("TEACHER_TOKEN") or _load_cached_token()
+    if token:
+        return token
+        
+    response = session.post(LOGIN_URL, json=TEACHER_CREDENTIALS)
     if response.status_code == 200:
-        return response.json()['access_token']
+        token = response.json()['access_token']
+        try:
+            TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            TOKEN_CACHE_PATH.write_text(json.dumps({"key": _credentials_key(), "token": token}))
+        except OSError:
+            pass  # Caching is best effort
+        return token
     else:
         print(f"Login failed: {response.status_code} - {response.text}")
         return None
@@ -32,7 +84,7 @@ def test_quiz_operations():
     
     # Test get quizzes
     print("Testing get quizzes...")
-    courses_response = requests.get(f"{BASE_URL}/teacher/courses/my", headers=headers)
+    courses_response = session.get(f"{BASE_URL}/teacher/courses/my", headers=headers)
     if courses_response.status_code != 200:
         print(f"Failed to get courses: {courses_response.status_code}")
         return
@@ -46,7 +98,7 @@ def test_quiz_operations():
     print(f"Using course ID: {course_id}")
     
     # Get existing quizzes
-    quizzes_response = requests.get(f"{BASE_URL}/teacher/courses/{course_id}/quizzes", headers=headers)
+    quizzes_response = session.get(f"{BASE_URL}/teacher/courses/{course_id}/quizzes", headers=headers)
     print(f"Get quizzes: {quizzes_response.status_code}")
     
     if quizzes_response.status_code == 200:
@@ -59,7 +111,7 @@ def test_quiz_operations():
             
             # Test get quiz submissions
             print("\nTesting get quiz submissions...")
-            submissions_response = requests.get(f"{BASE_URL}/teacher/quizzes/{quiz_id}/submissions", headers=headers)
+            submissions_response = session.get(f"{BASE_URL}/teacher/quizzes/{quiz_id}/submissions", headers=headers)
             print(f"Get quiz submissions: {submissions_response.status_code}")
             if submissions_response.status_code == 200:
                 submissions = submissions_response.json()
@@ -73,14 +125,14 @@ def test_quiz_operations():
                 "title": "Updated Quiz Title",
                 "description": "Updated description"
             }
-            update_response = requests.put(f"{BASE_URL}/teacher/quizzes/{quiz_id}", json=update_data, headers=headers)
+            update_response = session.put(f"{BASE_URL}/teacher/quizzes/{quiz_id}", json=update_data, headers=headers)
             print(f"Update quiz: {update_response.status_code}")
             if update_response.status_code != 200:
                 print(f"Error: {update_response.text}")
             
             # Test delete quiz (commented out to avoid actually deleting)
             # print("\nTesting delete quiz...")
-            # delete_response = requests.delete(f"{BASE_URL}/teacher/quizzes/{quiz_id}", headers=headers)
+            # delete_response = session.delete(f"{BASE_URL}/teacher/quizzes/{quiz_id}", headers=headers)
             # print(f"Delete quiz: {delete_response.status_code}")
             
         else:
@@ -4,51 +4,74 @@ Test script for teacher routes to verify they work correctly
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 from config import Config
 
-# Connect to MongoDB to check data
-client = MongoClient(Config.MONGO_URI)
+# Connect to MongoDB to check data - a small compressed pool is plenty for this script
+client = MongoClient(
+    Config.MONGO_URI,
+    maxPoolSize=10,
+    compressors="zstd,zlib",
+    serverSelectionTimeoutMS=2000,
+    connect=True
+)
 db = client.get_database()
 
+# One keep-alive session for every call; the teacher token is set on it once
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
 def test_data_availability():
     """Check if we have the necessary data in the database"""
     print("=== Checking Database Data ===")
     
     # Check if we have users
-    total_users = db.users.count_documents({})
+    total_users = db.users.estimated_document_count()
     print(f"Total users in database: {total_users}")
     
-    # Check if we have teachers
-    teachers = list(db.users.find({"role": "teacher"}, {"_id": 1, "username": 1, "first_name": 1, "last_name": 1}))
-    print(f"Number of teachers: {len(teachers)}")
+    # Check if we have teachers - count and the three printed samples in one round-trip
+    teacher_facets = next(db.users.aggregate([
+        {"$match": {"role": "teacher"}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "samples": [
+                {"$limit": 3},
+                {"$project": {"_id": 1, "username": 1, "first_name": 1, "last_name": 1}}
+            ]
+        }}
+    ]))
+    total_teachers = teacher_facets["total"][0]["n"] if teacher_facets["total"] else 0
+    teachers = teacher_facets["samples"]
+    print(f"Number of teachers: {total_teachers}")
     if teachers:
         print("Sample teachers:")
-        for teacher in teachers[:3]:
+        for teacher in teachers:
             print(f"  - {teacher.get('username')} ({teacher.get('first_name')} {teacher.get('last_name')})")
     
     # Check if we have courses
-    total_courses = db.courses.count_documents({})
+    total_courses = db.courses.estimated_document_count()
     print(f"Total courses in database: {total_courses}")
     
     # Check if we have courses assigned to teachers
-    teacher_courses = list(db.courses.find({}, {"_id": 1, "course_code": 1, "course_name": 1, "teacher_id": 1}))
-    print(f"Courses with teacher assignments: {len([c for c in teacher_courses if c.get('teacher_id')])}")
+    assigned_courses = db.courses.count_documents({"teacher_id": {"$ne": None}})
+    print(f"Courses with teacher assignments: {assigned_courses}")
     
     # Check if we have enrollments
-    total_enrollments = db.enrollments.count_documents({})
+    total_enrollments = db.enrollments.estimated_document_count()
     print(f"Total enrollments: {total_enrollments}")
     
     # Check if we have assignments
-    total_assignments = db.assignments.count_documents({})
+    total_assignments = db.assignments.estimated_document_count()
     print(f"Total assignments: {total_assignments}")
     
     # Check if we have quizzes
-    total_quizzes = db.quizzes.count_documents({})
+    total_quizzes = db.quizzes.estimated_document_count()
     print(f"Total quizzes: {total_quizzes}")
     
-    return len(teachers) > 0
+    return total_teachers > 0
 
 def get_teacher_token():
     """Get authentication token for a teacher"""
@@ -69,7 +92,7 @@ def get_teacher_token():
     }
     
     try:
-        response = requests.post("http://localhost:5000/api/auth/login", json=login_data)
+        response = session.post("http://localhost:5000/api/auth/login", json=login_data)
         if response.status_code == 200:
             token = response.json().get('access_token')
             print("Successfully obtained teacher token")
@@ -85,7 +108,8 @@ def test_teacher_endpoints(token):
     """Test teacher API endpoints"""
     print("\n=== Testing Teacher Endpoints ===")
     
-    headers = {"Authorization": f"Bearer {token}"}
+    # Every later request on the session carries the token
+    session.headers.update({"Authorization": f"Bearer {token}"})
     base_url = "http://localhost:5000/api/teacher"
     
     # Test basic endpoints
@@ -97,7 +121,7 @@ def test_teacher_endpoints(token):
     
     for endpoint in endpoints:
         try:
-            response = requests.get(f"{base_url}{endpoint}", headers=headers)
+            response = session.get(f"{base_url}{endpoint}")
             print(f"{endpoint}: {response.status_code}")
             if response.status_code == 200:
                 data = response.json()
@@ -108,47 +132,53 @@ def test_teacher_endpoints(token):
                     if data:
                         # Test assignment creation with the first course
                         test_assignment_creation(token, data[0]['_id'])
-                        # Test assignment fetching for all courses
-                        for course in data[:2]:  # Test first 2 courses
-                            test_assignment_fetching(token, course['_id'])
+                        # Fetch each course once, concurrently; this also shows the new assignment
+                        with ThreadPoolExecutor(max_workers=8) as executor:
+                            list(executor.map(lambda course: test_assignment_fetching(token, course['_id']), data))
             else:
                 print(f"  Error: {response.text}")
         except requests.exceptions.RequestException as e:
             print(f"{endpoint}: Connection error - {e}")
 
-def test_assignment_creation(token, course_id):
-    """Test creating an assignment"""
+def test_assignment_creation(token, course_id, count=3):
+    """Test creating assignments, batched into one request when the server supports it"""
     print(f"\n=== Testing Assignment Creation for Course {course_id} ===")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    # Test assignment data
-    assignment_data = {
-        "title": "Test Assignment",
-        "description": "This is a test assignment created via API",
-        "assignment_type": "homework",
-        "total_points": 100,
-        "due_date": "2024-12-31T23:59:00",
-        "instructions": "Complete all exercises and submit your work."
-    }
+    # Test assignment data - one variation per assignment
+    assignments = [
+        {
+            "title": f"Test Assignment {i + 1}",
+            "description": "This is a test assignment created via API",
+            "assignment_type": "Homework",
+            "total_points": 100,
+            "due_date": f"2024-12-{31 - i}T23:59:00",
+            "instructions": "Complete all exercises and submit your work."
+        }
+        for i in range(count)
+    ]
+    course_url = f"http://localhost:5000/api/teacher/courses/{course_id}/assignments"
     
     try:
-        response = requests.post(
-            f"http://localhost:5000/api/teacher/courses/{course_id}/assignments",
-            headers=headers,
-            json=assignment_data
-        )
+        response = session.post(f"{course_url}/batch", json={"assignments": assignments})
         
-        print(f"Assignment creation: {response.status_code}")
+        if response.status_code in (404, 405):
+            # Older server without the batch endpoint: create them one at a time
+            for assignment_data in assignments:
+                response = session.post(course_url, json=assignment_data)
+                print(f"Assignment creation: {response.status_code}")
+                if response.status_code == 201:
+                    print(f"  Created assignment: {response.json().get('assignment_id')}")
+                else:
+                    print(f"  Failed to create assignment: {response.text}")
+            return
+        
+        print(f"Batch assignment creation: {response.status_code}")
         if response.status_code == 201:
             result = response.json()
-            print(f"  Created assignment: {result.get('assignment_id')}")
+            print(f"  Created assignments: {result.get('assignment_ids')}")
             print(f"  Message: {result.get('message')}")
-            
-            # Test fetching assignments for the course
-            test_assignment_fetching(token, course_id)
         else:
-            print(f"  Failed to create assignment: {response.text}")
+            print(f"  Failed to create assignments: {response.text}")
             
     except requests.exceptions.RequestException as e:
         print(f"Assignment creation error: {e}")
@@ -157,12 +187,9 @@ def test_assignment_fetching(token, course_id):
     """Test fetching assignments for a course"""
     print(f"\n=== Testing Assignment Fetching for Course {course_id} ===")
     
-    headers = {"Authorization": f"Bearer {token}"}
-    
     try:
-        response = requests.get(
-            f"http://localhost:5000/api/teacher/courses/{course_id}/assignments",
-            headers=headers
+        response = session.get(
+            f"http://localhost:5000/api/teacher/courses/{course_id}/assignments"
         )
         
         print(f"Fetch assignments: {response.status_code}")
@@ -182,6 +209,9 @@ if __name__ == "__main__":
     print("Teacher Routes Test Script")
     print("=" * 50)
     
+    # Open the pool up front so the first query doesn't pay for the handshake
+    client.admin.command("ping")
+    
     # Check if we have data
     if not test_data_availability():
         print("\nNo teachers found in database. You may need to run init_db.py first.")
@@ -1,15 +1,22 @@
 from typing import Dict, Any, List, Optional, Callable, Union
-from bson import ObjectId
-from pymongo import MongoClient, ASCENDING, DESCENDING, TEXT
+from bson import ObjectId, json_util
+from pymongo import MongoClient, IndexModel, ReturnDocument, UpdateOne, UpdateMany, ASCENDING, DESCENDING, TEXT
 from pymongo.errors import DuplicateKeyError, OperationFailure, ConnectionFailure, ServerSelectionTimeoutError
 from extensions import mongo
 from datetime import datetime, timedelta
+import atexit
 import time
 import threading
 import functools
+import hashlib
+import json
 import logging
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from cachetools import TLRUCache
+
+logger = logging.getLogger(__name__)
 
 class OptimisticLockException(Exception):
     """Exception raised when optimistic locking fails."""
@@ -25,316 +32,593 @@ class CascadeDeleteException(Exception):
 
 # Performance monitoring
 class QueryPerformanceMonitor:
-    def __init__(self):
-        self.query_stats = defaultdict(list)
+    def __init__(self, history_size: int = 1000):
+        # Recent samples per operation; totals are kept separately so memory stays bounded
+        self.query_stats = defaultdict(lambda: deque(maxlen=history_size))
+        self.aggregates = defaultdict(lambda: {'count': 0, 'sum': 0.0, 'max': 0.0, 'min': float('inf'), 'slow': 0})
         self.slow_query_threshold = 1.0  # seconds
     
     def record_query(self, operation: str, collection: str, duration: float, query: Dict = None):
-        self.query_stats[f"{collection}.{operation}"].append({
+        key = f"{collection}.{operation}"
+        self.query_stats[key].append({
             'duration': duration,
             'timestamp': datetime.utcnow(),
-            'query': str(query) if query else None
+            'query_hash': hash(str(query)) if query else None
         })
         
+        totals = self.aggregates[key]
+        totals['count'] += 1
+        totals['sum'] += duration
+        totals['max'] = max(totals['max'], duration)
+        totals['min'] = min(totals['min'], duration)
+        
         if duration > self.slow_query_threshold:
+            totals['slow'] += 1
             logging.warning(f"Slow query detected: {collection}.{operation} took {duration:.2f}s")
     
     def get_performance_report(self) -> Dict[str, Any]:
         report = {}
-        for operation, stats in self.query_stats.items():
-            if stats:
-                durations = [s['duration'] for s in stats]
+        for operation, totals in self.aggregates.items():
+            if totals['count']:
                 report[operation] = {
-                    'count': len(stats),
-                    'avg_duration': sum(durations) / len(durations),
-                    'max_duration': max(durations),
-                    'min_duration': min(durations),
-                    'slow_queries': len([d for d in durations if d > self.slow_query_threshold])
+                    'count': totals['count'],
+                    'avg_duration': totals['sum'] / totals['count'],
+                    'max_duration': totals['max'],
+                    'min_duration': totals['min'],
+                    'slow_queries': totals['slow']
                 }
         return report
 
 # Global performance monitor
 performance_monitor = QueryPerformanceMonitor()
 
+# Cache lookup sentinels: no live entry, and a stored None result
+_MISSING = object()
+_CACHED_NONE = object()
+
 # Query result cache
 class QueryCache:
-    def __init__(self, ttl_seconds: int = 300):
-        self.cache = {}
+    """
+    Thread-safe TTL cache for query results. Keys are namespaced as
+    '<namespace>:...' and invalidate_pattern only scans keys in the pattern's
+    namespace. Entries are spread over lock-striped shards so concurrent
+    requests rarely contend, and get_or_compute lets only one caller per key
+    run the query on a miss.
+    """
+    
+    _SHARD_COUNT = 16
+    
+    def __init__(self, ttl_seconds: int = 300, maxsize: int = 10_000):
         self.ttl = ttl_seconds
+        self.maxsize = maxsize
+        shard_size = max(1, maxsize // self._SHARD_COUNT)
+        # Entries are (value, expires_at) on the monotonic clock
+        self._shards = [(self._new_store(shard_size), threading.Lock()) for _ in range(self._SHARD_COUNT)]
+        self._namespaces = defaultdict(set)
+        self._namespaces_lock = threading.Lock()
+        self._indexed_count = 0
+        # Keys currently being computed by get_or_compute, set once the result is stored
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+    
+    @staticmethod
+    def _new_store(maxsize: int):
+        # Bounded, with expired entries swept in O(1) as the cache is touched
+        return TLRUCache(maxsize=maxsize, ttu=lambda key, entry, now: entry[1], timer=time.monotonic)
+    
+    def _shard(self, key: str):
+        return self._shards[hash(key) & (self._SHARD_COUNT - 1)]
+    
+    def _lookup(self, key: str) -> Any:
+        store, lock = self._shard(key)
+        with lock:
+            entry = store.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if time.monotonic() < expires_at:
+                return value
+            store.pop(key, None)
+        return _MISSING
     
     def get(self, key: str) -> Any:
-        if key in self.cache:
-            data, timestamp = self.cache[key]
-            if datetime.utcnow() - timestamp < timedelta(seconds=self.ttl):
-                return data
-            else:
-                del self.cache[key]
-        return None
+        value = self._lookup(key)
+        return None if value is _MISSING or value is _CACHED_NONE else value
     
-    def set(self, key: str, value: Any):
-        self.cache[key] = (value, datetime.utcnow())
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        # Entries may override the default TTL, e.g. for short-lived dashboard stats
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        store, lock = self._shard(key)
+        with lock:
+            store[key] = (value, expires_at)
+        with self._namespaces_lock:
+            keys = self._namespaces[key.split(':', 1)[0]]
+            if key not in keys:
+                keys.add(key)
+                self._indexed_count += 1
+            needs_rebuild = self._indexed_count > 2 * self.maxsize
+        if needs_rebuild:
+            self._rebuild_namespaces()
+    
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """
+        Return the cached value for key, or compute and store it. Concurrent
+        misses on the same key wait for the first caller instead of all
+        running compute(). A None result is cached too, so empty results
+        don't send every waiter back to the database.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return None if value is _CACHED_NONE else value
+        
+        while True:
+            with self._inflight_lock:
+                event = self._inflight.get(key)
+                is_leader = event is None
+                if is_leader:
+                    event = self._inflight[key] = threading.Event()
+            if is_leader:
+                break
+            event.wait()
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return None if value is _CACHED_NONE else value
+            # The leader failed; take over
+        
+        try:
+            value = compute()
+            self.set(key, _CACHED_NONE if value is None else value, ttl)
+            return value
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            event.set()
     
     def clear(self):
-        self.cache.clear()
+        for store, lock in self._shards:
+            with lock:
+                store.clear()
+        with self._namespaces_lock:
+            self._namespaces.clear()
+            self._indexed_count = 0
     
     def invalidate_pattern(self, pattern: str):
-        keys_to_remove = [k for k in self.cache.keys() if pattern in k]
+        namespace = pattern.split(':', 1)[0]
+        with self._namespaces_lock:
+            keys = self._namespaces.get(namespace)
+            if not keys:
+                return
+            keys_to_remove = [k for k in keys if pattern in k]
+            keys.difference_update(keys_to_remove)
+            self._indexed_count -= len(keys_to_remove)
         for key in keys_to_remove:
-            del self.cache[key]
+            store, lock = self._shard(key)
+            with lock:
+                store.pop(key, None)
+    
+    def _rebuild_namespaces(self):
+        # Drop index entries for keys the cache has already evicted or expired
+        live_keys = []
+        for store, lock in self._shards:
+            with lock:
+                live_keys.extend(store.keys())
+        namespaces = defaultdict(set)
+        for key in live_keys:
+            namespaces[key.split(':', 1)[0]].add(key)
+        with self._namespaces_lock:
+            self._namespaces = namespaces
+            self._indexed_count = len(live_keys)
 
 # Global cache instance
 query_cache = QueryCache()
 
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+def _is_oid(value: Any) -> bool:
+    """Cheap check for a 24-character hex ObjectId string, avoiding the exception path."""
+    return type(value) is str and len(value) == 24 and _HEX_DIGITS.issuperset(value)
+
 class DatabaseUtils:
     """Utility class for advanced database operations."""
     
+    # Collection handles reused across calls instead of rebuilt per lookup
+    _COLL_CACHE: Dict[str, Any] = {}
+    
+    # Collection name -> key patterns of its existing indexes, for _index_hint
+    _INDEX_KEYS_CACHE: Dict[str, set] = {}
+    
+    # Collection name -> cache key prefixes to drop when it is written,
+    # registered through cached_query(invalidate_on=...)
+    _CACHE_DEPENDENTS: Dict[str, set] = defaultdict(set)
+    
     # Connection pool settings
-    _connection_pool_size = 50
+    _connection_pool_size = 200
+    _min_pool_size = 10  # Kept warm so idle recovery doesn't pay for new handshakes
     _max_idle_time = 30000  # 30 seconds
     _server_selection_timeout = 3000  # 3 seconds
+    _wait_queue_timeout = 2000  # Fail fast when the pool is exhausted instead of queueing
+    _max_connecting = 4  # Concurrent new-socket handshakes per pool
+    
+    # One client (pool + monitor threads) per URI for the whole process
+    _clients: Dict[Any, MongoClient] = {}
+    _clients_lock = threading.Lock()
     
     @staticmethod
-    def configure_connection_pool(pool_size: int = 50, max_idle_time: int = 30000, 
-                                server_selection_timeout: int = 3000):
+    def configure_connection_pool(pool_size: int = 200, max_idle_time: int = 30000, 
+                                server_selection_timeout: int = 3000, min_pool_size: int = 10,
+                                wait_queue_timeout: int = 2000):
         """Configure MongoDB connection pool settings."""
         DatabaseUtils._connection_pool_size = pool_size
+        DatabaseUtils._min_pool_size = min_pool_size
         DatabaseUtils._max_idle_time = max_idle_time
         DatabaseUtils._server_selection_timeout = server_selection_timeout
+        DatabaseUtils._wait_queue_timeout = wait_queue_timeout
+    
+    @staticmethod
+    def get_optimized_client(uri: str, read_pref_tags: Optional[List[Dict[str, str]]] = None) -> MongoClient:
+        """
+        Get a MongoDB client with optimized connection settings.
+        read_pref_tags (e.g. [{"az": "us-east-1a"}, {}]) prefers members in the app server's zone.
+        Clients are shared: repeated calls with the same arguments return the same instance.
+        """
+        client_key = (uri, repr(read_pref_tags))
+        with DatabaseUtils._clients_lock:
+            client = DatabaseUtils._clients.get(client_key)
+            if client is None:
+                client = DatabaseUtils._clients[client_key] = DatabaseUtils._build_client(uri, read_pref_tags)
+            return client
     
     @staticmethod
-    def get_optimized_client(uri: str) -> MongoClient:
-        """Get a MongoDB client with optimized connection settings."""
+    def _build_client(uri: str, read_pref_tags: Optional[List[Dict[str, str]]]) -> MongoClient:
+        read_options = {}
+        if read_pref_tags:
+            read_options['readPreferenceTags'] = read_pref_tags
         return MongoClient(
             uri,
             maxPoolSize=DatabaseUtils._connection_pool_size,
-            minPoolSize=5,
+            minPoolSize=DatabaseUtils._min_pool_size,
             maxIdleTimeMS=DatabaseUtils._max_idle_time,
+            waitQueueTimeoutMS=DatabaseUtils._wait_queue_timeout,
+            maxConnecting=DatabaseUtils._max_connecting,
             serverSelectionTimeoutMS=DatabaseUtils._server_selection_timeout,
             connectTimeoutMS=5000,
             socketTimeoutMS=10000,
             retryWrites=True,
             retryReads=True,
-            readPreference='secondaryPreferred'  # Use secondary for reads when possible
+            # Read from any member within 15ms of the fastest, primary included
+            readPreference='nearest',
+            localThresholdMS=15,
+            **read_options
         )
     
+    @staticmethod
+    def close_clients():
+        """Close every shared client; registered to run at interpreter exit."""
+        with DatabaseUtils._clients_lock:
+            for client in DatabaseUtils._clients.values():
+                client.close()
+            DatabaseUtils._clients.clear()
+    
+    @staticmethod
+    def _coll(name: str):
+        """Return a cached Collection handle, rebuilding it if mongo.db was re-initialised."""
+        db = mongo.db
+        collection = DatabaseUtils._COLL_CACHE.get(name)
+        if collection is None or collection.database is not db:
+            collection = DatabaseUtils._COLL_CACHE[name] = db[name]
+        return collection
+    
     @staticmethod
     def monitor_query_performance(collection_name: str, operation: str):
         """Decorator to monitor query performance."""
+        # Resolved once per decorated function rather than on every call
+        record = performance_monitor.record_query
+        clock = time.perf_counter
+        error_operation = f"{operation}_error"
+        
         def decorator(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = clock()
                 try:
                     result = func(*args, **kwargs)
-                    duration = time.time() - start_time
-                    performance_monitor.record_query(operation, collection_name, duration)
-                    return result
-                except Exception as e:
-                    duration = time.time() - start_time
-                    performance_monitor.record_query(f"{operation}_error", collection_name, duration)
-                    raise e
+                except BaseException:
+                    record(error_operation, collection_name, clock() - start_time)
+                    raise
+                record(operation, collection_name, clock() - start_time)
+                return result
             return wrapper
         return decorator
     
     @staticmethod
-    def cached_query(cache_key: str, ttl: int = 300):
-        """Decorator to cache query results."""
+    def cached_query(cache_key: str, ttl: int = 300, key_fn: Optional[Callable] = None,
+                     invalidate_on: Optional[List[str]] = None):
+        """
+        Decorator to cache query results per set of call arguments.
+        Entries are stored under '<cache_key>:<argument digest>', so cache_key
+        should carry the namespace used for invalidation (e.g. 'courses:by_teacher').
+        key_fn(*args, **kwargs) may return a custom suffix instead of the digest.
+        invalidate_on lists collections whose writes through invalidate_cache_for
+        should drop these entries.
+        """
+        for collection_name in invalidate_on or ():
+            DatabaseUtils._CACHE_DEPENDENTS[collection_name].add(f"{cache_key}:")
+        
+        def _encode_arg(value):
+            # Canonical Extended JSON keeps ObjectIds, dates and int/float distinct
+            # from their string forms; anything BSON cannot encode falls back to repr
+            try:
+                return json_util.default(value, json_util.CANONICAL_JSON_OPTIONS)
+            except TypeError:
+                return {"$repr": f"{type(value).__qualname__}:{value!r}"}
+        
+        def _args_digest(args, kwargs):
+            # Digest a sorted-key serialization rather than hash() so distinct
+            # arguments never share an entry
+            payload = json.dumps([args, kwargs], default=_encode_arg, sort_keys=True)
+            return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+        
         def decorator(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
-                # Check cache first
-                cached_result = query_cache.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
-                
-                # Execute query and cache result
-                result = func(*args, **kwargs)
-                query_cache.set(cache_key, result)
-                return result
+                suffix = key_fn(*args, **kwargs) if key_fn else _args_digest(args, kwargs)
+                key = f"{cache_key}:{suffix}"
+                return query_cache.get_or_compute(key, lambda: func(*args, **kwargs), ttl)
             return wrapper
         return decorator
     
+    @staticmethod
+    def invalidate_cache_for(*collection_names: str):
+        """
+        Drop cached results after writes to the given collections: the
+        collection's own namespace plus any cached_query registered on it.
+        """
+        for collection_name in collection_names:
+            query_cache.invalidate_pattern(collection_name)
+            for pattern in DatabaseUtils._CACHE_DEPENDENTS.get(collection_name, ()):
+                query_cache.invalidate_pattern(pattern)
+    
     @staticmethod
     def create_indexes():
         """Create all necessary indexes for the collections with optimizations."""
         try:
-            # Create indexes in background to avoid blocking
-            index_options = {'background': True, 'sparse': False}
-            text_index_options = {'background': True, 'default_language': 'english'}
-            # Users collection indexes
-            mongo.db.users.create_index("username", unique=True, **index_options)
-            mongo.db.users.create_index("email", unique=True, **index_options)
-            mongo.db.users.create_index("role", **index_options)
-            mongo.db.users.create_index("is_active", **index_options)
-            mongo.db.users.create_index("date_joined", **index_options)
-            mongo.db.users.create_index("last_login", **index_options)
-            mongo.db.users.create_index([("first_name", TEXT), ("last_name", TEXT)], **text_index_options)
-            # Compound index for common queries
-            mongo.db.users.create_index([("role", 1), ("is_active", 1)], **index_options)
-            
-            # Courses collection indexes
-            mongo.db.courses.create_index("course_code", unique=True, **index_options)
-            mongo.db.courses.create_index("teacher_id", **index_options)
-            mongo.db.courses.create_index("department", **index_options)
-            mongo.db.courses.create_index([("semester", 1), ("year", 1)], **index_options)
-            mongo.db.courses.create_index("created_at", **index_options)
-            mongo.db.courses.create_index("updated_at", **index_options)
-            mongo.db.courses.create_index([("course_name", TEXT), ("description", TEXT)], **text_index_options)
-            # Compound indexes for performance
-            mongo.db.courses.create_index([("department", 1), ("semester", 1), ("year", 1)], **index_options)
-            mongo.db.courses.create_index([("teacher_id", 1), ("semester", 1), ("year", 1)], **index_options)
-            
-            # Enrollments collection indexes
-            mongo.db.enrollments.create_index([("student_id", 1), ("course_id", 1)], unique=True, **index_options)
-            mongo.db.enrollments.create_index("student_id", **index_options)
-            mongo.db.enrollments.create_index("course_id", **index_options)
-            mongo.db.enrollments.create_index("status", **index_options)
-            mongo.db.enrollments.create_index("enrollment_date", **index_options)
-            mongo.db.enrollments.create_index("drop_date", sparse=True, **index_options)
-            # Compound indexes for common queries
-            mongo.db.enrollments.create_index([("student_id", 1), ("status", 1)], **index_options)
-            mongo.db.enrollments.create_index([("course_id", 1), ("status", 1)], **index_options)
-            
-            # Assignments collection indexes
-            mongo.db.assignments.create_index("course_id", **index_options)
-            mongo.db.assignments.create_index("teacher_id", **index_options)
-            mongo.db.assignments.create_index("due_date", **index_options)
-            mongo.db.assignments.create_index("created_date", **index_options)
-            mongo.db.assignments.create_index("is_published", **index_options)
-            mongo.db.assignments.create_index([("title", TEXT), ("description", TEXT)], **text_index_options)
-            # Compound indexes for performance
-            mongo.db.assignments.create_index([("course_id", 1), ("due_date", 1)], **index_options)
-            mongo.db.assignments.create_index([("course_id", 1), ("is_published", 1)], **index_options)
-            
-            # Quizzes collection indexes
-            mongo.db.quizzes.create_index("course_id", **index_options)
-            mongo.db.quizzes.create_index("teacher_id", **index_options)
-            mongo.db.quizzes.create_index("due_date", **index_options)
-            mongo.db.quizzes.create_index("start_date", **index_options)
-            mongo.db.quizzes.create_index("created_date", **index_options)
-            mongo.db.quizzes.create_index("is_published", **index_options)
-            mongo.db.quizzes.create_index([("title", TEXT), ("description", TEXT)], **text_index_options)
-            # Compound indexes
-            mongo.db.quizzes.create_index([("course_id", 1), ("due_date", 1)], **index_options)
-            mongo.db.quizzes.create_index([("course_id", 1), ("is_published", 1)], **index_options)
-            
-            # Assignment submissions indexes
-            mongo.db.assignment_submissions.create_index([("student_id", 1), ("assignment_id", 1)], unique=True, **index_options)
-            mongo.db.assignment_submissions.create_index("assignment_id", **index_options)
-            mongo.db.assignment_submissions.create_index("student_id", **index_options)
-            mongo.db.assignment_submissions.create_index("submission_date", **index_options)
-            mongo.db.assignment_submissions.create_index("status", **index_options)
-            mongo.db.assignment_submissions.create_index("graded_date", sparse=True, **index_options)
-            # Compound indexes
-            mongo.db.assignment_submissions.create_index([("assignment_id", 1), ("status", 1)], **index_options)
-            
-            # Quiz submissions indexes
-            mongo.db.quiz_submissions.create_index([("student_id", 1), ("quiz_id", 1)], unique=True, **index_options)
-            mongo.db.quiz_submissions.create_index("quiz_id", **index_options)
-            mongo.db.quiz_submissions.create_index("student_id", **index_options)
-            mongo.db.quiz_submissions.create_index("submission_date", **index_options)
-            mongo.db.quiz_submissions.create_index("graded_date", sparse=True, **index_options)
-            # Compound indexes
-            mongo.db.quiz_submissions.create_index([("quiz_id", 1), ("submission_date", 1)], **index_options)
-            
-            # Attendance collection indexes
-            mongo.db.attendance.create_index([("course_id", 1), ("date", 1)], unique=True, **index_options)
-            mongo.db.attendance.create_index("course_id", **index_options)
-            mongo.db.attendance.create_index("date", **index_options)
-            mongo.db.attendance.create_index("recorded_by", **index_options)
-            mongo.db.attendance.create_index("recorded_at", **index_options)
-            
-            # Grades collection indexes
-            mongo.db.grades.create_index([("student_id", 1), ("course_id", 1)], unique=True, **index_options)
-            mongo.db.grades.create_index("student_id", **index_options)
-            mongo.db.grades.create_index("course_id", **index_options)
-            mongo.db.grades.create_index("final_percentage", sparse=True, **index_options)
-            mongo.db.grades.create_index("calculated_at", sparse=True, **index_options)
+            # 4.2+ ignores background and its hybrid build yields better indexes
+            # without it; older servers still need it to avoid blocking writes
+            version = tuple(mongo.cx.server_info().get('versionArray', [0, 0])[:2])
+            index_options = {} if version >= (4, 2) else {'background': True}
+            # Before 5.0 a partial index can't share its key pattern with a full one,
+            # so the hot-subset twins below are only built on newer servers
+            partial_twins = version >= (5, 0)
+            index_models = {
+                "users": [
+                    IndexModel("username", unique=True, **index_options),
+                    IndexModel("email", unique=True, **index_options),
+                    IndexModel("role", **index_options),
+                    IndexModel("is_active", **index_options),
+                    IndexModel("date_joined", **index_options),
+                    IndexModel("last_login", **index_options),
+                    IndexModel([("first_name", TEXT), ("last_name", TEXT)], default_language='english', **index_options),
+                    # Compound index for common queries
+                    IndexModel([("role", 1), ("is_active", 1)], **index_options),
+                    # Student lookups by institutional ID (bulk grade uploads)
+                    IndexModel("student_id_str", sparse=True, **index_options),
+                ],
+                "courses": [
+                    IndexModel("course_code", unique=True, **index_options),
+                    IndexModel("department", **index_options),
+                    IndexModel([("semester", 1), ("year", 1)], **index_options),
+                    IndexModel("created_at", **index_options),
+                    IndexModel("updated_at", **index_options),
+                    IndexModel([("course_name", TEXT), ("description", TEXT)], default_language='english', **index_options),
+                    # Compound indexes for performance
+                    IndexModel([("department", 1), ("semester", 1), ("year", 1)], **index_options),
+                    # Also serves teacher_id-only lookups via its prefix
+                    IndexModel([("teacher_id", 1), ("semester", 1), ("year", 1)], **index_options),
+                    # Covers the per-route teacher ownership check
+                    IndexModel([("teacher_id", 1), ("_id", 1)], **index_options),
+                ],
+                "enrollments": [
+                    # Also serves student_id-only lookups via its prefix
+                    IndexModel([("student_id", 1), ("course_id", 1)], unique=True, **index_options),
+                    IndexModel("course_id", **index_options),
+                    IndexModel("enrollment_date", **index_options),
+                    IndexModel("drop_date", sparse=True, **index_options),
+                    IndexModel("student_id", **index_options),
+                    # Compound indexes for common queries
+                    IndexModel([("student_id", 1), ("status", 1)], **index_options),
+                    IndexModel([("course_id", 1), ("status", 1)], **index_options),
+                    # Covers enrolled-student lookups per course
+                    IndexModel([("course_id", 1), ("status", 1), ("student_id", 1)], **index_options),
+                ],
+                "assignments": [
+                    IndexModel("teacher_id", **index_options),
+                    IndexModel("created_date", **index_options),
+                    IndexModel("due_date", **index_options),
+                    IndexModel([("title", TEXT), ("description", TEXT)], default_language='english', **index_options),
+                    # Equality fields first, then the due_date sort key
+                    IndexModel([("course_id", 1), ("due_date", 1)], **index_options),
+                    IndexModel([("course_id", 1), ("is_published", 1), ("due_date", 1)], **index_options),
+                ],
+                "quizzes": [
+                    IndexModel("teacher_id", **index_options),
+                    IndexModel("due_date", **index_options),
+                    IndexModel("start_date", **index_options),
+                    IndexModel("created_date", **index_options),
+                    IndexModel("is_published", **index_options),
+                    IndexModel([("title", TEXT), ("description", TEXT)], default_language='english', **index_options),
+                    # Compound indexes (course_id lookups use the prefix)
+                    IndexModel([("course_id", 1), ("due_date", 1)], **index_options),
+                    IndexModel([("course_id", 1), ("is_published", 1)], **index_options),
+                ],
+                "assignment_submissions": [
+                    IndexModel([("student_id", 1), ("assignment_id", 1)], unique=True, **index_options),
+                    IndexModel("submission_date", **index_options),
+                    IndexModel("status", **index_options),
+                    IndexModel("graded_date", sparse=True, **index_options),
+                    # Compound indexes (these and the unique key cover single-field lookups by prefix)
+                    IndexModel([("assignment_id", 1), ("status", 1)], **index_options),
+                    IndexModel([("assignment_id", 1), ("score", 1)], **index_options),
+                ],
+                "quiz_submissions": [
+                    IndexModel([("student_id", 1), ("quiz_id", 1)], unique=True, **index_options),
+                    IndexModel("submission_date", **index_options),
+                    IndexModel("graded_date", sparse=True, **index_options),
+                    # Compound indexes (these and the unique key cover single-field lookups by prefix)
+                    IndexModel([("quiz_id", 1), ("submission_date", 1)], **index_options),
+                ],
+                "attendance": [
+                    # Also serves course_id-only lookups via its prefix
+                    IndexModel([("course_id", 1), ("date", 1)], unique=True, **index_options),
+                    IndexModel("date", **index_options),
+                    IndexModel("recorded_by", **index_options),
+                    IndexModel("recorded_at", **index_options),
+                ],
+                "grades": [
+                    IndexModel([("student_id", 1), ("course_id", 1)], unique=True, **index_options),
+                    IndexModel("final_percentage", sparse=True, **index_options),
+                    IndexModel("calculated_at", sparse=True, **index_options),
+                    # Compound indexes for gradebook queries (course_id lookups use the prefix)
+                    IndexModel([("course_id", 1), ("student_id", 1)], **index_options),
+                    IndexModel([("course_id", 1), ("components.component_id", 1)], **index_options),
+                ],
+                "calendar_events": [
+                    IndexModel("created_by", **index_options),
+                    IndexModel("start_datetime", **index_options),
+                    IndexModel("end_datetime", sparse=True, **index_options),
+                    IndexModel("event_type", **index_options),
+                    IndexModel("created_at", **index_options),
+                    # Compound indexes for calendar queries (course_id lookups use the prefix)
+                    IndexModel([("course_id", 1), ("start_datetime", 1)], **index_options),
+                    IndexModel([("created_by", 1), ("start_datetime", 1)], **index_options),
+                ],
+                "notifications": [
+                    IndexModel("created_at", **index_options),
+                    IndexModel("notification_type", **index_options),
+                    IndexModel("related_course_id", sparse=True, **index_options),
+                    # All of a recipient's notifications, newest first (also recipient deletes)
+                    IndexModel([("recipient_id", 1), ("created_at", -1)], **index_options),
+                ],
+                "locks": [
+                    # One holder per key; expired locks are removed by the TTL monitor
+                    IndexModel("lock_key", unique=True, **index_options),
+                    IndexModel("expires_at", expireAfterSeconds=0, **index_options),
+                ],
+                "query_performance": [
+                    IndexModel("timestamp", **index_options),
+                    IndexModel("duration", **index_options),
+                    IndexModel([("operation", 1), ("timestamp", -1)], **index_options),
+                ],
+                "slow_queries": [
+                    # Metrics reports only look at a recent window
+                    IndexModel([("timestamp", -1)], **index_options),
+                ],
+            }
             
-            # Calendar events collection indexes
-            mongo.db.calendar_events.create_index("course_id", **index_options)
-            mongo.db.calendar_events.create_index("created_by", **index_options)
-            mongo.db.calendar_events.create_index("start_datetime", **index_options)
-            mongo.db.calendar_events.create_index("end_datetime", sparse=True, **index_options)
-            mongo.db.calendar_events.create_index("event_type", **index_options)
-            mongo.db.calendar_events.create_index("created_at", **index_options)
-            # Compound indexes for calendar queries
-            mongo.db.calendar_events.create_index([("course_id", 1), ("start_datetime", 1)], **index_options)
-            mongo.db.calendar_events.create_index([("created_by", 1), ("start_datetime", 1)], **index_options)
+            if partial_twins:
+                # Smaller indexes over the rows the hot queries read
+                index_models["enrollments"].append(
+                    # Active enrollments only - the students' dashboard predicate
+                    IndexModel("student_id", partialFilterExpression={"status": "enrolled"},
+                               name="student_id_enrolled", **index_options))
+                index_models["assignments"].append(
+                    # Upcoming deadlines only ever consider published assignments
+                    IndexModel("due_date", partialFilterExpression={"is_published": True},
+                               name="due_date_published", **index_options))
+                index_models["notifications"].append(
+                    # Unread inbox for a recipient, newest first
+                    IndexModel([("recipient_id", 1), ("created_at", -1)],
+                               partialFilterExpression={"is_read": False},
+                               name="recipient_unread_created_at", **index_options))
+            
+            # One createIndexes command per collection; every collection is dispatched at
+            # once so startup waits for the slowest build rather than the sum
+            with ThreadPoolExecutor(max_workers=len(index_models)) as executor:
+                futures = {
+                    collection_name: executor.submit(mongo.db[collection_name].create_indexes, models)
+                    for collection_name, models in index_models.items()
+                }
             
-            # Notifications collection indexes
-            mongo.db.notifications.create_index("recipient_id", **index_options)
-            mongo.db.notifications.create_index("is_read", **index_options)
-            mongo.db.notifications.create_index("created_at", **index_options)
-            mongo.db.notifications.create_index("notification_type", **index_options)
-            mongo.db.notifications.create_index("related_course_id", sparse=True, **index_options)
-            # Compound indexes for notification queries
-            mongo.db.notifications.create_index([("recipient_id", 1), ("is_read", 1)], **index_options)
-            mongo.db.notifications.create_index([("recipient_id", 1), ("created_at", -1)], **index_options)
+            # Re-issuing identical specs is a no-op, so one collection's conflict
+            # shouldn't hide whether the others were built
+            failed = {}
+            for collection_name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[collection_name] = e
             
-            # Performance monitoring collection
-            mongo.db.query_performance.create_index("operation", **index_options)
-            mongo.db.query_performance.create_index("timestamp", **index_options)
-            mongo.db.query_performance.create_index("duration", **index_options)
-            mongo.db.query_performance.create_index([("operation", 1), ("timestamp", -1)], **index_options)
+            if failed:
+                for collection_name, error in failed.items():
+                    logger.error("Error creating indexes on %s: %s", collection_name, error)
+                return False
             
-            print("All database indexes created successfully")
+            DatabaseUtils._INDEX_KEYS_CACHE.clear()
+            logger.info("All database indexes created successfully")
             return True
             
-        except Exception as e:
-            print(f"Error creating indexes: {str(e)}")
+        except Exception:
+            logger.exception("Error creating indexes")
             return False
     
     @staticmethod
     def optimistic_lock_update(collection_name: str, document_id: ObjectId, 
-                              update_data: Dict[str, Any], max_retries: int = 3) -> Dict[str, Any]:
+                              update_data: Dict[str, Any], max_retries: int = 3,
+                              expected_version: Optional[int] = None) -> Dict[str, Any]:
         """
         Perform optimistic locking update on a document.
-        Uses a version field to detect concurrent modifications.
+        Uses a version field to detect concurrent modifications: the update only
+        applies if the version is unchanged, and bumps it server-side. With
+        expected_version the caller's snapshot is checked once; without it the
+        current version is read and the compare-and-swap retried on conflict.
         """
-        collection = getattr(mongo.db, collection_name)
+        if max_retries < 1:
+            raise ValueError("max_retries must be at least 1")
+        
+        collection = DatabaseUtils._coll(collection_name)
+        
+        # Pipeline update so the increment happens atomically in the same round-trip
+        update_pipeline = [{"$set": {
+            **{field: {"$literal": value} for field, value in update_data.items()},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+            "updated_at": "$$NOW"
+        }}]
         
         for attempt in range(max_retries):
             try:
-                # Get current document with version
-                current_doc = collection.find_one({"_id": document_id})
-                if not current_doc:
-                    raise ValueError("Document not found")
-                
-                current_version = current_doc.get("version", 0)
+                version = expected_version
+                if version is None:
+                    current_doc = collection.find_one({"_id": document_id}, {"version": 1})
+                    if not current_doc:
+                        raise ValueError("Document not found")
+                    version = current_doc.get("version", 0)
                 
-                # Prepare update with incremented version
-                update_with_version = {
-                    **update_data,
-                    "version": current_version + 1,
-                    "updated_at": datetime.utcnow()
-                }
-                
-                # Attempt update with version check
-                result = collection.update_one(
-                    {"_id": document_id, "version": current_version},
-                    {"$set": update_with_version}
+                # Documents written before versioning have no version field
+                query = {"_id": document_id, "version": version if version else {"$in": [0, None]}}
+                updated_doc = collection.find_one_and_update(
+                    query, update_pipeline, return_document=ReturnDocument.AFTER
                 )
-                
-                if result.modified_count == 1:
-                    # Success - document was updated
-                    updated_doc = collection.find_one({"_id": document_id})
-                    return {"success": True, "document": updated_doc}
-                else:
-                    # Version mismatch - document was modified by another process
-                    if attempt == max_retries - 1:
-                        raise OptimisticLockException("Document was modified by another process")
-                    
-                    # Wait a bit before retrying
-                    time.sleep(0.1 * (attempt + 1))
-                    continue
-                    
-            except Exception as e:
+            except ConnectionFailure:
                 if attempt == max_retries - 1:
-                    raise e
+                    raise
                 time.sleep(0.1 * (attempt + 1))
+                continue
+            
+            if updated_doc is not None:
+                break
+            
+            if expected_version is not None:
+                # The caller's snapshot is stale; re-reading here would hide that
+                if collection.find_one({"_id": document_id}, {"_id": 1}) is None:
+                    raise ValueError("Document not found")
+                raise OptimisticLockException("Document was modified by another process")
+            
+            # Version mismatch - document was modified by another process
+            if attempt == max_retries - 1:
+                raise OptimisticLockException("Document was modified by another process")
+            time.sleep(0.1 * (attempt + 1))
         
-        raise OptimisticLockException("Failed to update after maximum retries")
+        DatabaseUtils.invalidate_cache_for(collection_name)
+        return {"success": True, "document": updated_doc}
     
     @staticmethod
     def pessimistic_lock_operation(lock_key: str, operation: Callable, timeout: int = 30) -> Any:
@@ -342,37 +626,38 @@ class DatabaseUtils:
         Perform pessimistic locking using a distributed lock mechanism.
         Uses a locks collection to implement distributed locking.
         """
-        lock_collection = mongo.db.locks
+        lock_collection = DatabaseUtils._coll("locks")
         lock_id = ObjectId()
+        now = datetime.utcnow()
+        
+        # Acquire in one round-trip: take over an expired lock or insert a new one.
+        # A live lock for the key fails the filter, so the upsert hits the unique index.
+        try:
+            lock_collection.find_one_and_update(
+                {"lock_key": lock_key, "$or": [
+                    {"expires_at": {"$lt": now}},
+                    # Locks written before expires_at was a date (missing or epoch floats)
+                    {"expires_at": {"$not": {"$type": "date"}}}
+                ]},
+                {"$set": {
+                    "owner_id": lock_id,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=timeout),
+                    "thread_id": threading.get_ident()
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            raise OperationFailure("Failed to acquire lock - another process is holding it")
         
         try:
-            # Try to acquire lock
-            lock_doc = {
-                "_id": lock_id,
-                "lock_key": lock_key,
-                "acquired_at": datetime.utcnow(),
-                "expires_at": datetime.utcnow().timestamp() + timeout,
-                "thread_id": threading.get_ident()
-            }
-            
-            # Clean up expired locks first
-            lock_collection.delete_many({
-                "lock_key": lock_key,
-                "expires_at": {"$lt": datetime.utcnow().timestamp()}
-            })
-            
-            # Try to acquire lock
-            try:
-                lock_collection.insert_one(lock_doc)
-            except DuplicateKeyError:
-                raise OperationFailure("Failed to acquire lock - another process is holding it")
-            
             # Execute the operation
             return operation()
             
         finally:
-            # Release lock
-            lock_collection.delete_one({"_id": lock_id})
+            # Release lock only if it is still ours
+            lock_collection.delete_one({"lock_key": lock_key, "owner_id": lock_id})
     
     @staticmethod
     def setup_sharding_config():
@@ -380,17 +665,21 @@ class DatabaseUtils:
         Configure sharding for large collections.
         This is a placeholder for production sharding setup.
         """
+        # Leading shard-key fields must be high cardinality and not monotonically
+        # increasing; low-cardinality filters (role, department, semester) stay as
+        # secondary indexes instead of shard-key prefixes
         sharding_config = {
             "users": {
-                "shard_key": {"role": 1, "_id": 1},
+                "shard_key": {"username": "hashed"},
                 "collections": ["users"]
             },
             "courses": {
-                "shard_key": {"department": 1, "semester": 1, "_id": 1},
+                "shard_key": {"_id": "hashed"},
                 "collections": ["courses", "enrollments"]
             },
             "submissions": {
-                "shard_key": {"course_id": 1, "submission_date": 1},
+                # Hashing course_id spreads writes for a busy course across chunks
+                "shard_key": {"course_id": "hashed", "submission_date": 1},
                 "collections": ["assignment_submissions", "quiz_submissions"]
             }
         }
@@ -451,21 +740,26 @@ class DatabaseUtils:
             results['user'] = user
             
             if user['role'] == 'student':
-                # Delete student-related data
+                # Delete student-related data; each filter is pinned to the unique
+                # (student_id, ...) key whose prefix it matches
                 results['enrollments'] = mongo.db.enrollments.delete_many(
-                    {"student_id": user_id}, session=session
+                    {"student_id": user_id},
+                    hint=DatabaseUtils._index_hint("enrollments", [("student_id", 1), ("course_id", 1)]), session=session
                 ).deleted_count
                 
                 results['assignment_submissions'] = mongo.db.assignment_submissions.delete_many(
-                    {"student_id": user_id}, session=session
+                    {"student_id": user_id},
+                    hint=DatabaseUtils._index_hint("assignment_submissions", [("student_id", 1), ("assignment_id", 1)]), session=session
                 ).deleted_count
                 
                 results['quiz_submissions'] = mongo.db.quiz_submissions.delete_many(
-                    {"student_id": user_id}, session=session
+                    {"student_id": user_id},
+                    hint=DatabaseUtils._index_hint("quiz_submissions", [("student_id", 1), ("quiz_id", 1)]), session=session
                 ).deleted_count
                 
                 results['grades'] = mongo.db.grades.delete_many(
-                    {"student_id": user_id}, session=session
+                    {"student_id": user_id},
+                    hint=DatabaseUtils._index_hint("grades", [("student_id", 1), ("course_id", 1)]), session=session
                 ).deleted_count
                 
                 # Remove from course enrollments lists
@@ -518,10 +812,76 @@ class DatabaseUtils:
             return results
         
         if session:
-            return _delete_user_data(session)
+            results = _delete_user_data(session)
         else:
             with DatabaseUtils.transaction_session() as session:
-                return _delete_user_data(session)
+                results = _delete_user_data(session)
+        
+        DatabaseUtils.invalidate_cache_for(
+            "users", "courses", "enrollments", "assignment_submissions", "quiz_submissions",
+            "grades", "notifications", "calendar_events"
+        )
+        return results
+    
+    @staticmethod
+    def _index_hint(collection_name: str, keys: List[tuple]) -> Optional[List[tuple]]:
+        """
+        Return keys as a hint if the collection has an index with exactly that
+        key pattern, else None so the planner chooses. Hinting a missing index
+        would fail the whole cascade transaction.
+        """
+        existing = DatabaseUtils._INDEX_KEYS_CACHE.get(collection_name)
+        if existing is None:
+            info = DatabaseUtils._coll(collection_name).index_information()
+            # Shell-created indexes may store directions as doubles (1.0)
+            existing = {
+                tuple((field, int(d) if isinstance(d, float) else d) for field, d in index['key'])
+                for index in info.values()
+            }
+            DatabaseUtils._INDEX_KEYS_CACHE[collection_name] = existing
+        return keys if tuple(keys) in existing else None
+    
+    @staticmethod
+    def _distinct_ids(collection_name: str, query: Dict[str, Any], session=None) -> List[ObjectId]:
+        """Fetch matching _ids as one bare array rather than a document per id."""
+        collection = DatabaseUtils._coll(collection_name)
+        try:
+            return collection.distinct("_id", query, session=session)
+        except OperationFailure:
+            # distinct results are capped at 16MB; stream the ids in batches instead
+            return [doc['_id'] for doc in collection.find(query, {"_id": 1}, session=session)]
+    
+    @staticmethod
+    def _course_with_dependents(course_id: ObjectId, session=None) -> Optional[Dict[str, Any]]:
+        """
+        Load a course with its assignment and quiz ids attached as
+        _assignment_ids/_quiz_ids, using one aggregation instead of three queries.
+        """
+        def _ids_lookup(from_collection, as_field):
+            return {"$lookup": {
+                "from": from_collection,
+                "let": {"course_id": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$course_id", "$$course_id"]}}},
+                    {"$project": {"_id": 1}}
+                ],
+                "as": as_field
+            }}
+        
+        try:
+            course = next(mongo.db.courses.aggregate([
+                {"$match": {"_id": course_id}},
+                _ids_lookup("assignments", "_assignment_ids"),
+                _ids_lookup("quizzes", "_quiz_ids"),
+                {"$set": {"_assignment_ids": "$_assignment_ids._id", "_quiz_ids": "$_quiz_ids._id"}}
+            ], session=session), None)
+        except OperationFailure:
+            # The combined document exceeded 16MB; fetch the id lists separately
+            course = mongo.db.courses.find_one({"_id": course_id}, session=session)
+            if course:
+                course['_assignment_ids'] = DatabaseUtils._distinct_ids("assignments", {"course_id": course_id}, session)
+                course['_quiz_ids'] = DatabaseUtils._distinct_ids("quizzes", {"course_id": course_id}, session)
+        return course
     
     @staticmethod
     def cascade_delete_course(course_id: ObjectId, session=None) -> Dict[str, Any]:
@@ -531,84 +891,88 @@ class DatabaseUtils:
         def _delete_course_data(session):
             results = {}
             
-            # Get course details first
-            course = mongo.db.courses.find_one({"_id": course_id}, session=session)
+            # Get course details and every dependent assignment/quiz id in one round-trip
+            course = DatabaseUtils._course_with_dependents(course_id, session)
             if not course:
                 raise CascadeDeleteException("Course not found")
             
+            assignment_ids = course.pop('_assignment_ids')
+            quiz_ids = course.pop('_quiz_ids')
             results['course'] = course
             
-            # Delete enrollments
+            # Each delete below is pinned to the index whose prefix matches its filter,
+            # so a stale cached plan can't pick a worse one
             results['enrollments'] = mongo.db.enrollments.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("enrollments", [("course_id", 1)]), session=session
             ).deleted_count
             
             # Delete assignments and their submissions
-            assignment_ids = [doc['_id'] for doc in mongo.db.assignments.find(
-                {"course_id": course_id}, {"_id": 1}, session=session
-            )]
-            
             if assignment_ids:
                 results['assignment_submissions'] = mongo.db.assignment_submissions.delete_many(
-                    {"assignment_id": {"$in": assignment_ids}}, session=session
+                    {"assignment_id": {"$in": assignment_ids}},
+                    hint=DatabaseUtils._index_hint("assignment_submissions", [("assignment_id", 1), ("status", 1)]),
+                    session=session
                 ).deleted_count
             else:
                 results['assignment_submissions'] = 0
             
             results['assignments'] = mongo.db.assignments.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("assignments", [("course_id", 1), ("due_date", 1)]), session=session
             ).deleted_count
             
             # Delete quizzes and their submissions
-            quiz_ids = [doc['_id'] for doc in mongo.db.quizzes.find(
-                {"course_id": course_id}, {"_id": 1}, session=session
-            )]
-            
             if quiz_ids:
                 results['quiz_submissions'] = mongo.db.quiz_submissions.delete_many(
-                    {"quiz_id": {"$in": quiz_ids}}, session=session
+                    {"quiz_id": {"$in": quiz_ids}},
+                    hint=DatabaseUtils._index_hint("quiz_submissions", [("quiz_id", 1), ("submission_date", 1)]),
+                    session=session
                 ).deleted_count
             else:
                 results['quiz_submissions'] = 0
             
             results['quizzes'] = mongo.db.quizzes.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("quizzes", [("course_id", 1), ("due_date", 1)]), session=session
             ).deleted_count
             
             # Delete grades
             results['grades'] = mongo.db.grades.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("grades", [("course_id", 1), ("student_id", 1)]), session=session
             ).deleted_count
             
             # Delete attendance records
             results['attendance'] = mongo.db.attendance.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("attendance", [("course_id", 1), ("date", 1)]), session=session
             ).deleted_count
             
             # Delete calendar events
             results['calendar_events'] = mongo.db.calendar_events.delete_many(
-                {"course_id": course_id}, session=session
+                {"course_id": course_id},
+                hint=DatabaseUtils._index_hint("calendar_events", [("course_id", 1), ("start_datetime", 1)]), session=session
             ).deleted_count
             
             # Delete notifications
             results['notifications'] = mongo.db.notifications.delete_many(
-                {"related_course_id": course_id}, session=session
+                {"related_course_id": course_id},
+                hint=DatabaseUtils._index_hint("notifications", [("related_course_id", 1)]), session=session
             ).deleted_count
             
-            # Remove from teacher's courses_teaching list
+            # Remove from the teacher's courses_teaching and students' enrolled_courses
+            # lists in a single bulk command
+            user_updates = [UpdateMany(
+                {"enrolled_courses": course_id},
+                {"$pull": {"enrolled_courses": course_id}}
+            )]
             if course.get('teacher_id'):
-                mongo.db.users.update_one(
+                user_updates.append(UpdateOne(
                     {"_id": course['teacher_id']},
-                    {"$pull": {"courses_teaching": course_id}},
-                    session=session
-                )
-            
-            # Remove from students' enrolled_courses lists
-            mongo.db.users.update_many(
-                {"enrolled_courses": course_id},
-                {"$pull": {"enrolled_courses": course_id}},
-                session=session
-            )
+                    {"$pull": {"courses_teaching": course_id}}
+                ))
+            mongo.db.users.bulk_write(user_updates, ordered=False, session=session)
             
             # Finally delete the course
             result = mongo.db.courses.delete_one({"_id": course_id}, session=session)
@@ -617,10 +981,16 @@ class DatabaseUtils:
             return results
         
         if session:
-            return _delete_course_data(session)
+            results = _delete_course_data(session)
         else:
             with DatabaseUtils.transaction_session() as session:
-                return _delete_course_data(session)
+                results = _delete_course_data(session)
+        
+        DatabaseUtils.invalidate_cache_for(
+            "courses", "users", "enrollments", "assignments", "assignment_submissions", "quizzes",
+            "quiz_submissions", "grades", "attendance", "calendar_events", "notifications"
+        )
+        return results
     
     @staticmethod
     def cascade_delete_assignment(assignment_id: ObjectId, session=None) -> Dict[str, Any]:
@@ -639,7 +1009,9 @@ class DatabaseUtils:
             
             # Delete submissions
             results['submissions'] = mongo.db.assignment_submissions.delete_many(
-                {"assignment_id": assignment_id}, session=session
+                {"assignment_id": assignment_id},
+                hint=DatabaseUtils._index_hint("assignment_submissions", [("assignment_id", 1), ("status", 1)]),
+                session=session
             ).deleted_count
             
             # Remove from course assignments list
@@ -666,10 +1038,15 @@ class DatabaseUtils:
             return results
         
         if session:
-            return _delete_assignment_data(session)
+            results = _delete_assignment_data(session)
         else:
             with DatabaseUtils.transaction_session() as session:
-                return _delete_assignment_data(session)
+                results = _delete_assignment_data(session)
+        
+        DatabaseUtils.invalidate_cache_for(
+            "assignments", "assignment_submissions", "courses", "calendar_events", "notifications"
+        )
+        return results
     
     @staticmethod
     def get_aggregation_pipeline(operation_type: str, **kwargs) -> List[Dict[str, Any]]:
@@ -686,21 +1063,18 @@ class DatabaseUtils:
                     "as": "course_info"
                 }},
                 {"$unwind": "$course_info"},
+                # Plain equality join on the (student_id, course_id) index prefix;
+                # the student's few grade records are then narrowed to this course
                 {"$lookup": {
                     "from": "grades",
-                    "let": {"student_id": "$student_id", "course_id": "$course_id"},
-                    "pipeline": [
-                        {"$match": {
-                            "$expr": {
-                                "$and": [
-                                    {"$eq": ["$student_id", "$$student_id"]},
-                                    {"$eq": ["$course_id", "$$course_id"]}
-                                ]
-                            }
-                        }}
-                    ],
+                    "localField": "student_id",
+                    "foreignField": "student_id",
                     "as": "grades"
                 }},
+                {"$set": {"grades": {"$filter": {
+                    "input": "$grades",
+                    "cond": {"$eq": ["$$this.course_id", "$course_id"]}
+                }}}},
                 {"$project": {
                     "course_code": "$course_info.course_code",
                     "course_name": "$course_info.course_name",
@@ -745,28 +1119,22 @@ class DatabaseUtils:
                 }}
             ],
             
+            # Runs against assignments: the course filter narrows to a handful of
+            # assignments before their submissions are joined by assignment_id
             "course_performance_analytics": [
                 {"$match": {"course_id": kwargs.get("course_id")}},
                 {"$lookup": {
                     "from": "assignment_submissions",
-                    "let": {"course_id": "$course_id"},
-                    "pipeline": [
-                        {"$lookup": {
-                            "from": "assignments",
-                            "localField": "assignment_id",
-                            "foreignField": "_id",
-                            "as": "assignment"
-                        }},
-                        {"$unwind": "$assignment"},
-                        {"$match": {"$expr": {"$eq": ["$assignment.course_id", "$$course_id"]}}}
-                    ],
+                    "localField": "_id",
+                    "foreignField": "assignment_id",
                     "as": "submissions"
                 }},
+                {"$unwind": "$submissions"},
                 {"$group": {
-                    "_id": "$student_id",
-                    "total_submissions": {"$sum": {"$size": "$submissions"}},
+                    "_id": "$submissions.student_id",
+                    "total_submissions": {"$sum": 1},
                     "avg_score": {"$avg": "$submissions.score"},
-                    "course_info": {"$first": "$$ROOT"}
+                    "course_id": {"$first": "$course_id"}
                 }}
             ]
         }
@@ -774,9 +1142,11 @@ class DatabaseUtils:
         return pipelines.get(operation_type, [])
     
     @staticmethod
-    def execute_transaction(operations: List[Callable], session=None) -> Dict[str, Any]:
+    def execute_transaction(operations: List[Union[Callable, tuple]], session=None) -> Dict[str, Any]:
         """
         Execute multiple operations in a transaction.
+        Operations are callables taking the session, or (collection_name, write_op)
+        tuples; adjacent tuples for the same collection are sent as one bulk_write.
         """
         if session is None:
             with mongo.cx.start_session() as session:
@@ -785,14 +1155,48 @@ class DatabaseUtils:
             return DatabaseUtils._execute_with_session(operations, session)
     
     @staticmethod
-    def _execute_with_session(operations: List[Callable], session) -> Dict[str, Any]:
+    def execute_bulk_transaction(collection_name: str, ops: List[Any], session=None) -> Dict[str, Any]:
+        """
+        Apply write operations (InsertOne, UpdateOne, ...) to one collection in a transaction.
+        Prefer this over execute_transaction with one callable per write when every
+        write targets the same collection: the batch goes out as a single command.
+        """
+        def _bulk(session):
+            return DatabaseUtils._coll(collection_name).bulk_write(ops, ordered=False, session=session)
+        
+        result = DatabaseUtils.execute_transaction([_bulk], session=session)
+        if result["success"]:
+            return {"success": True, "result": result["results"][0]}
+        return result
+    
+    @staticmethod
+    def _execute_with_session(operations: List[Union[Callable, tuple]], session) -> Dict[str, Any]:
         """Helper method to execute operations within a session."""
         try:
             with session.start_transaction():
                 results = []
+                pending_collection, pending_ops = None, []
+                
+                def flush_pending():
+                    # One ordered bulk_write per run of same-collection writes
+                    if pending_ops:
+                        results.append(DatabaseUtils._coll(pending_collection).bulk_write(
+                            list(pending_ops), ordered=True, session=session
+                        ))
+                        pending_ops.clear()
+                
                 for operation in operations:
-                    result = operation(session)
-                    results.append(result)
+                    if isinstance(operation, tuple):
+                        collection_name, write_op = operation
+                        if collection_name != pending_collection:
+                            flush_pending()
+                            pending_collection = collection_name
+                        pending_ops.append(write_op)
+                    else:
+                        flush_pending()
+                        pending_collection = None
+                        results.append(operation(session))
+                flush_pending()
                 
                 # If we get here, all operations succeeded
                 return {"success": True, "results": results}
@@ -803,75 +1207,150 @@ class DatabaseUtils:
     
     @staticmethod
     def get_collection_stats() -> Dict[str, Any]:
-        """Get statistics about all collections."""
+        """
+        Get statistics about all collections, cached briefly for dashboards.
+        Concurrent polls on an expired entry share one refresh.
+        """
+        return query_cache.get_or_compute("stats:collections", DatabaseUtils._collect_collection_stats, ttl=60)
+    
+    @staticmethod
+    def _collect_collection_stats() -> Dict[str, Any]:
         collections = [
             "users", "courses", "enrollments", "assignments", "quizzes",
             "assignment_submissions", "quiz_submissions", "attendance",
             "grades", "calendar_events", "notifications"
         ]
         
-        stats = {}
-        for collection_name in collections:
+        def _stats_for(collection_name):
+            collection = DatabaseUtils._coll(collection_name)
             try:
-                collection = getattr(mongo.db, collection_name)
-                stats[collection_name] = {
-                    "count": collection.count_documents({}),
+                # One round-trip per collection for count, size and index count
+                coll_stats = next(collection.aggregate([
+                    {"$collStats": {"count": {}, "storageStats": {"scale": 1}}}
+                ]))
+                storage_stats = coll_stats.get("storageStats", {})
+                return {
+                    "count": coll_stats.get("count", storage_stats.get("count", 0)),
+                    "size": storage_stats.get("size", 0),
+                    "indexes": len(storage_stats.get("indexSizes", {}))
+                }
+            except OperationFailure:
+                # $collStats options unsupported (MongoDB < 4.4); use the separate calls
+                return {
+                    "count": collection.estimated_document_count(),
                     "size": mongo.db.command("collStats", collection_name).get("size", 0),
-                    "indexes": len(collection.list_indexes())
+                    "indexes": len(list(collection.list_indexes()))
                 }
+        
+        def _safe_stats_for(collection_name):
+            try:
+                return _stats_for(collection_name)
             except Exception as e:
-                stats[collection_name] = {"error": str(e)}
+                return {"error": str(e)}
         
-        return stats
+        # Overlap the per-collection round-trips
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            return dict(zip(collections, executor.map(_safe_stats_for, collections)))
+    
+    # ObjectId-bearing fields converted by serialize_doc
+    _OID_FIELDS = frozenset([
+        '_id', 'teacher_id', 'student_id', 'course_id', 'assignment_id', 'quiz_id',
+        'created_by', 'graded_by', 'recipient_id', 'related_course_id',
+        'related_assignment_id'
+    ])
+    # Array fields that might contain ObjectIds
+    _ARRAY_FIELDS = frozenset(['enrolled_courses', 'courses_teaching', 'assignments', 'quizzes', 'attendees'])
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _make_serializer(schema_key: tuple) -> Callable:
+        """
+        Compile a converter for documents with the given key layout.
+        Only the ObjectId and array fields present in the layout are emitted,
+        plus the nested feedback[].student_id conversion used by courses.
+        """
+        lines = ["def _serialize(d):"]
+        for field in sorted(DatabaseUtils._OID_FIELDS.intersection(schema_key)):
+            lines += [
+                f"    v = d[{field!r}]",
+                "    if type(v) is ObjectId:",
+                f"        d[{field!r}] = str(v)",
+            ]
+        for field in sorted(DatabaseUtils._ARRAY_FIELDS.intersection(schema_key)):
+            lines += [
+                f"    v = d[{field!r}]",
+                "    if type(v) is list:",
+                f"        d[{field!r}] = [str(i) if type(i) is ObjectId else i for i in v]",
+            ]
+        if 'feedback' in schema_key:
+            lines += [
+                "    v = d['feedback']",
+                "    if type(v) is list:",
+                "        for item in v:",
+                "            if type(item) is dict and type(item.get('student_id')) is ObjectId:",
+                "                item['student_id'] = str(item['student_id'])",
+            ]
+        lines.append("    return d")
+        namespace = {"ObjectId": ObjectId}
+        exec("\n".join(lines), namespace)
+        return namespace["_serialize"]
     
     @staticmethod
-    def serialize_doc(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def serialize_doc(doc: Optional[Dict[str, Any]], inplace: bool = False) -> Optional[Dict[str, Any]]:
         """
         Convert ObjectId fields to strings for JSON serialization.
-        Handles single documents.
+        Handles single documents; pass inplace=True to skip copying a document
+        the caller owns.
         """
         if not doc:
             return doc
             
-        serialized = doc.copy()
+        serialized = doc if inplace else doc.copy()
         
-        # Convert _id to string
-        if '_id' in serialized and isinstance(serialized['_id'], ObjectId):
-            serialized['_id'] = str(serialized['_id'])
-            
-        # Convert other common ObjectId fields
-        objectid_fields = [
-            'teacher_id', 'student_id', 'course_id', 'assignment_id', 'quiz_id',
-            'created_by', 'graded_by', 'recipient_id', 'related_course_id',
-            'related_assignment_id'
-        ]
-        
-        for field in objectid_fields:
-            if field in serialized and isinstance(serialized[field], ObjectId):
-                serialized[field] = str(serialized[field])
-                
-        # Handle array fields that might contain ObjectIds
-        array_fields = ['enrolled_courses', 'courses_teaching', 'assignments', 'quizzes', 'attendees']
-        for field in array_fields:
-            if field in serialized and isinstance(serialized[field], list):
-                serialized[field] = [str(item) if isinstance(item, ObjectId) else item for item in serialized[field]]
-                
-        # Handle nested feedback array in courses
-        if 'feedback' in serialized and isinstance(serialized['feedback'], list):
-            for feedback_item in serialized['feedback']:
-                if isinstance(feedback_item, dict) and 'student_id' in feedback_item:
-                    if isinstance(feedback_item['student_id'], ObjectId):
-                        feedback_item['student_id'] = str(feedback_item['student_id'])
-                        
-        return serialized
+        # Documents from one collection share a key layout, so the field
+        # selection is compiled once per layout and reused
+        return DatabaseUtils._make_serializer(tuple(serialized))(serialized)
     
     @staticmethod
     def serialize_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Convert ObjectId fields to strings for JSON serialization.
-        Handles lists of documents.
+        Handles lists of documents, returning converted copies.
         """
-        return [DatabaseUtils.serialize_doc(doc) for doc in docs]
+        # A page usually shares one layout, so the compiled serializer is only
+        # looked up again when the layout changes
+        make_serializer = DatabaseUtils._make_serializer
+        layout = serializer = None
+        serialized = []
+        append = serialized.append
+        for doc in docs:
+            if not doc:
+                append(doc)
+                continue
+            doc_layout = tuple(doc)
+            if doc_layout != layout:
+                layout = doc_layout
+                serializer = make_serializer(layout)
+            append(serializer(doc.copy()))
+        return serialized
+    
+    @staticmethod
+    def attendance_present(record: Dict[str, Any], student_id: Any) -> bool:
+        """
+        Whether a student was marked present in an attendance record. Reads the
+        parallel students/present arrays, or the student_attendances map of
+        records written before the arrays were introduced.
+        """
+        student_id_str = str(student_id)
+        students = record.get('students')
+        if students is None:
+            return bool((record.get('student_attendances') or {}).get(student_id_str, False))
+        
+        present = record.get('present') or []
+        for index, student in enumerate(students):
+            if str(student) == student_id_str:
+                return bool(present[index]) if index < len(present) else False
+        return False
     
     @staticmethod
     def deserialize_objectids(data: Dict[str, Any], objectid_fields: List[str]) -> Dict[str, Any]:
@@ -881,25 +1360,14 @@ class DatabaseUtils:
         deserialized = data.copy()
         
         for field in objectid_fields:
-            if field in deserialized and deserialized[field]:
-                if isinstance(deserialized[field], str):
-                    try:
-                        deserialized[field] = ObjectId(deserialized[field])
-                    except Exception:
-                        # Invalid ObjectId string, leave as is
-                        pass
-                elif isinstance(deserialized[field], list):
-                    # Handle arrays of ObjectIds
-                    converted_list = []
-                    for item in deserialized[field]:
-                        if isinstance(item, str):
-                            try:
-                                converted_list.append(ObjectId(item))
-                            except Exception:
-                                converted_list.append(item)
-                        else:
-                            converted_list.append(item)
-                    deserialized[field] = converted_list
+            value = deserialized.get(field)
+            if not value:
+                continue
+            if _is_oid(value):
+                deserialized[field] = ObjectId(value)
+            elif type(value) is list:
+                # Handle arrays of ObjectIds; invalid strings are left as is
+                deserialized[field] = [ObjectId(item) if _is_oid(item) else item for item in value]
                     
         return deserialized
     
@@ -908,28 +1376,42 @@ class DatabaseUtils:
     @staticmethod
     def paginate_query(collection_name: str, query: Dict[str, Any] = None, 
                       page: int = 1, per_page: int = 20, sort_field: str = "_id", 
-                      sort_direction: int = -1) -> Dict[str, Any]:
+                      sort_direction: int = -1, exact_count: bool = True) -> Dict[str, Any]:
         """
         Paginate query results with metadata.
+        An unfiltered query is counted from collection metadata. With
+        exact_count=False a filtered query skips counting: one extra document
+        is fetched to set has_next, and total_count/total_pages are None.
         """
-        collection = getattr(mongo.db, collection_name)
+        collection = DatabaseUtils._coll(collection_name)
         query = query or {}
         
         # Calculate skip
         skip = (page - 1) * per_page
         
         # Get total count
-        total_count = collection.count_documents(query)
-        
-        # Calculate pagination metadata
-        total_pages = (total_count + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_prev = page > 1
+        if not query:
+            total_count = collection.estimated_document_count()
+        elif exact_count:
+            total_count = collection.count_documents(query)
+        else:
+            total_count = None
         
         # Get paginated results
-        cursor = collection.find(query).sort(sort_field, sort_direction).skip(skip).limit(per_page)
+        limit = per_page if total_count is not None else per_page + 1
+        cursor = collection.find(query).sort(sort_field, sort_direction).skip(skip).limit(limit)
         results = list(cursor)
         
+        # Calculate pagination metadata
+        if total_count is not None:
+            total_pages = (total_count + per_page - 1) // per_page
+            has_next = page < total_pages
+        else:
+            total_pages = None
+            has_next = len(results) > per_page
+            del results[per_page:]
+        has_prev = page > 1
+        
         # Serialize results
         serialized_results = DatabaseUtils.serialize_docs(results)
         
@@ -953,22 +1435,16 @@ class DatabaseUtils:
         """
         Paginate aggregation pipeline results.
         """
-        collection = getattr(mongo.db, collection_name)
-        
-        # Create count pipeline
-        count_pipeline = pipeline + [{"$count": "total"}]
-        count_result = list(collection.aggregate(count_pipeline))
-        total_count = count_result[0]["total"] if count_result else 0
+        collection = DatabaseUtils._coll(collection_name)
         
-        # Add pagination to pipeline
+        # Count and page in one pass so the pipeline's lookups/groups run once
         skip = (page - 1) * per_page
-        paginated_pipeline = pipeline + [
-            {"$skip": skip},
-            {"$limit": per_page}
-        ]
-        
-        # Execute paginated pipeline
-        results = list(collection.aggregate(paginated_pipeline))
+        facet = next(collection.aggregate(pipeline + [{"$facet": {
+            "data": [{"$skip": skip}, {"$limit": per_page}],
+            "total": [{"$count": "total"}]
+        }}]))
+        results = facet["data"]
+        total_count = facet["total"][0]["total"] if facet["total"] else 0
         
         # Calculate pagination metadata
         total_pages = (total_count + per_page - 1) // per_page
@@ -1015,38 +1491,30 @@ class DatabaseUtils:
         try:
             since = datetime.utcnow() - timedelta(hours=hours_back)
             
-            # Get slow query stats
-            slow_queries = list(mongo.db.slow_queries.find({
-                "timestamp": {"$gte": since}
-            }))
-            
-            # Aggregate stats
-            collection_stats = defaultdict(list)
-            operation_stats = defaultdict(list)
-            
-            for query in slow_queries:
-                collection_stats[query['collection']].append(query['duration'])
-                operation_stats[query['operation']].append(query['duration'])
-            
-            # Calculate averages
-            collection_avg = {
-                coll: sum(durations) / len(durations) 
-                for coll, durations in collection_stats.items()
-            }
-            
-            operation_avg = {
-                op: sum(durations) / len(durations) 
-                for op, durations in operation_stats.items()
-            }
+            # Group by collection and by operation on the server in a single round-trip
+            def slowest_by(field):
+                return [
+                    {"$group": {"_id": f"${field}", "avg": {"$avg": "$duration"}}},
+                    {"$sort": {"avg": -1}},
+                    {"$limit": 5}
+                ]
+            
+            facets = next(mongo.db.slow_queries.aggregate([
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$facet": {
+                    "total": [{"$count": "n"}],
+                    "collections": [{"$group": {"_id": "$collection"}}, {"$count": "n"}],
+                    "by_collection": slowest_by("collection"),
+                    "by_operation": slowest_by("operation")
+                }}
+            ]))
             
             return {
                 "period_hours": hours_back,
-                "slow_query_count": len(slow_queries),
-                "collections_affected": len(collection_stats),
-                "slowest_collections": dict(sorted(collection_avg.items(), 
-                                                 key=lambda x: x[1], reverse=True)[:5]),
-                "slowest_operations": dict(sorted(operation_avg.items(), 
-                                                key=lambda x: x[1], reverse=True)[:5]),
+                "slow_query_count": facets["total"][0]["n"] if facets["total"] else 0,
+                "collections_affected": facets["collections"][0]["n"] if facets["collections"] else 0,
+                "slowest_collections": {row["_id"]: row["avg"] for row in facets["by_collection"]},
+                "slowest_operations": {row["_id"]: row["avg"] for row in facets["by_operation"]},
                 "performance_monitor_stats": performance_monitor.get_performance_report()
             }
         except Exception as e:
@@ -1063,7 +1531,7 @@ class DatabaseUtils:
                                   'quizzes', 'assignment_submissions', 'quiz_submissions']
             
             for collection_name in collections_to_check:
-                collection = getattr(mongo.db, collection_name)
+                collection = DatabaseUtils._coll(collection_name)
                 
                 # Get index usage stats
                 try:
@@ -1103,7 +1571,7 @@ class DatabaseUtils:
             
             # Clean up expired locks
             result = mongo.db.locks.delete_many({
-                "expires_at": {"$lt": datetime.utcnow().timestamp()}
+                "expires_at": {"$lt": datetime.utcnow()}
             })
             cleanup_results['expired_locks_deleted'] = result.deleted_count
             
@@ -1135,7 +1603,7 @@ class DatabaseUtils:
                           'grades', 'calendar_events', 'notifications']
             
             for collection_name in collections:
-                collection = getattr(mongo.db, collection_name)
+                collection = DatabaseUtils._coll(collection_name)
                 indexes = list(collection.list_indexes())
                 backup_doc["indexes"][collection_name] = indexes
             
@@ -1166,7 +1634,7 @@ class DatabaseUtils:
             collections_health = {}
             for collection_name in ['users', 'courses', 'enrollments']:
                 try:
-                    count = getattr(mongo.db, collection_name).count_documents({})
+                    count = DatabaseUtils._coll(collection_name).count_documents({})
                     collections_health[collection_name] = {"count": count, "status": "ok"}
                 except Exception as e:
                     collections_health[collection_name] = {"status": "error", "message": str(e)}
@@ -1192,4 +1660,7 @@ class DatabaseUtils:
                 "timestamp": datetime.utcnow(),
                 "overall_status": "unhealthy",
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+
+# Release the shared clients' pooled connections on shutdown
+atexit.register(DatabaseUtils.close_clients)
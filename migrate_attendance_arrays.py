@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+from pymongo import MongoClient
+from backend.config import Config
+
+def migrate_attendance_arrays():
+    client = MongoClient(Config.MONGO_URI)
+    db = client.get_database()
+
+    # Convert the student_id -> present map into parallel students/present arrays
+    result = db.attendance.update_many(
+        {"student_attendances": {"$exists": True}},
+        [
+            {"$set": {"_entries": {"$objectToArray": {"$ifNull": ["$student_attendances", {}]}}}},
+            {"$set": {
+                "students": {"$map": {
+                    "input": "$_entries",
+                    "in": {"$convert": {"input": "$$this.k", "to": "objectId", "onError": "$$this.k"}}
+                }},
+                "present": {"$map": {"input": "$_entries", "in": {"$toBool": "$$this.v"}}}
+            }},
+            {"$unset": ["_entries", "student_attendances"]}
+        ]
+    )
+
+    print(f"Migrated {result.modified_count} attendance record(s)")
+
+if __name__ == "__main__":
+    migrate_attendance_arrays()
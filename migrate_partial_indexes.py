@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from backend.config import Config
+
+# Broad low-cardinality indexes replaced by the partial indexes
+REPLACED_INDEXES = {
+    "enrollments": ["status_1"],
+    "assignments": ["is_published_1"],
+    "notifications": ["recipient_id_1_is_read_1_created_at_-1"],
+    # Briefly created under a custom name; blocks the default-named index with the same keys
+    "courses": ["teacher_semester_year"],
+}
+
+# Partial indexes briefly built under the default name of a full index. The
+# full index can't be created until they are gone; the partial ones are
+# rebuilt under their own names on the next app start
+PARTIAL_UNDER_DEFAULT_NAME = {
+    "enrollments": ["student_id_1"],
+    "assignments": ["due_date_1"],
+    "notifications": ["recipient_id_1_created_at_-1"],
+}
+
+def drop_index(collection, index_name):
+    try:
+        collection.drop_index(index_name)
+        print(f"Dropped {collection.name}.{index_name}")
+    except OperationFailure as e:
+        # Already gone (IndexNotFound) or the collection doesn't exist yet
+        if e.code not in (26, 27):
+            raise
+
+def migrate_partial_indexes():
+    client = MongoClient(Config.MONGO_URI)
+    db = client.get_database()
+
+    for collection_name, index_names in REPLACED_INDEXES.items():
+        for index_name in index_names:
+            drop_index(db[collection_name], index_name)
+
+    for collection_name, index_names in PARTIAL_UNDER_DEFAULT_NAME.items():
+        indexes = db[collection_name].index_information()
+        for index_name in index_names:
+            if "partialFilterExpression" in indexes.get(index_name, {}):
+                drop_index(db[collection_name], index_name)
+
+    print("Restart the app to build the current indexes")
+
+if __name__ == "__main__":
+    migrate_partial_indexes()